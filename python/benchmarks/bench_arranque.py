@@ -0,0 +1,143 @@
+"""Arranque en frío: importación de main.py y primeras peticiones.
+
+Cada escenario corre en un proceso nuevo:
+
+- antes: importa los seis routers al crear la app (como main.py antes de la
+  carga perezosa);
+- perezoso: main.py actual, los routers se importan en su primera petición;
+- calentado: main.py con CALENTAR_AL_INICIO=1, esperando a que termine el
+  calentamiento antes de las peticiones.
+
+Para cada uno reporta el tiempo de importación, los módulos cargados y el
+tiempo de la primera petición liviana (/metrics), de la primera hoja
+calificada y del primer PDF segmentado. Con --detalle muestra además los
+imports más costosos (python -X importtime) del escenario "antes".
+
+Uso (desde la carpeta python/):
+    python benchmarks/bench_arranque.py [--repeticiones 3] [--detalle]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_ANTES = """
+from fastapi import FastAPI
+from obtener_respuestas_admin import router as r1
+from orden_cursos_simulacros import router as r2
+from obtener_respuestas_estudiantes import router as r3
+from analizador_temas_errados import router as r4
+from cache_resultados import router as r5
+from pipeline_simulacro import router as r6
+from metricas import router as r7, medir_peticion
+app = FastAPI()
+app.middleware("http")(medir_peticion)
+for r in (r1, r2, r3, r4, r5, r6, r7):
+    app.include_router(r)
+routers = None
+"""
+
+IMPORT_PEREZOSO = "from main import app, routers\n"
+
+# Se ejecuta en el proceso hijo; imprime un JSON con los tiempos en ms
+MEDICION = """
+import json, sys, time
+inicio = time.perf_counter()
+{importar}
+ms_import = (time.perf_counter() - inicio) * 1000
+modulos = len(sys.modules)
+
+from fastapi.testclient import TestClient
+
+def cronometrar(funcion):
+    inicio = time.perf_counter()
+    respuesta = funcion()
+    assert respuesta.status_code == 200, respuesta.text
+    return (time.perf_counter() - inicio) * 1000
+
+with open("plantilla.jpg", "rb") as f:
+    hoja = f.read()
+with open("simulacro_area_b_01.pdf", "rb") as f:
+    pdf = f.read()
+with open("cursos_examen.json", "rb") as f:
+    cursos = f.read()
+
+with TestClient(app) as cliente:
+    if routers is not None and {esperar}:
+        while not routers.calentado:
+            time.sleep(0.05)
+    ms_metricas = cronometrar(lambda: cliente.get("/metrics"))
+    ms_hoja = cronometrar(lambda: cliente.post(
+        "/obtener-respuestas-estudiantes", files={{"file": ("hoja.jpg", hoja)}}))
+    ms_pdf = cronometrar(lambda: cliente.post(
+        "/ordenar-cursos-preguntas", files={{"pdf_file": ("s.pdf", pdf), "json_file": ("c.json", cursos)}}))
+
+print(json.dumps({{"import": ms_import, "modulos": modulos, "metricas": ms_metricas,
+                  "hoja": ms_hoja, "pdf": ms_pdf}}))
+"""
+
+ESCENARIOS = {
+    "antes": (IMPORT_ANTES, False, {}),
+    "perezoso": (IMPORT_PEREZOSO, False, {}),
+    "calentado": (IMPORT_PEREZOSO, True, {"CALENTAR_AL_INICIO": "1"}),
+}
+
+
+def correr(importar, esperar, entorno):
+    codigo = MEDICION.format(importar=importar, esperar=esperar)
+    # Sin caché de disco para que cada corrida calcule igual
+    env = dict(os.environ, CACHE_DIR="", **entorno)
+    salida = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def imports_costosos(cantidad=8):
+    """Imports de primer nivel con mayor tiempo acumulado (µs), según python -X importtime."""
+    salida = subprocess.run([sys.executable, "-X", "importtime", "-c", IMPORT_ANTES],
+                            cwd=RAIZ, capture_output=True, text=True, check=True)
+    filas = []
+    for linea in salida.stderr.splitlines():
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        _, acumulado, nombre = linea.split("|")
+        # Solo módulos de primer nivel (sin sangría): su tiempo incluye lo que importan
+        if not nombre[1:].startswith(" "):
+            filas.append((int(acumulado), nombre.strip()))
+    return sorted(filas, reverse=True)[:cantidad]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=3, help="procesos por escenario")
+    parser.add_argument("--detalle", action="store_true", help="imports más costosos del escenario 'antes'")
+    args = parser.parse_args()
+
+    columnas = ("import", "modulos", "metricas", "hoja", "pdf")
+    print(f"{'escenario':<12}{'import ms':>11}{'módulos':>9}{'/metrics ms':>13}{'1.ª hoja ms':>13}{'1.er PDF ms':>13}")
+    resultados = {}
+    for nombre, (importar, esperar, entorno) in ESCENARIOS.items():
+        corridas = [correr(importar, esperar, entorno) for _ in range(args.repeticiones)]
+        resultados[nombre] = {c: float(np.median([r[c] for r in corridas])) for c in columnas}
+        r = resultados[nombre]
+        print(f"{nombre:<12}{r['import']:>11.0f}{r['modulos']:>9.0f}{r['metricas']:>13.1f}{r['hoja']:>13.1f}{r['pdf']:>13.1f}")
+
+    antes, despues = resultados["antes"], resultados["perezoso"]
+    print(f"\nimportación de main: {antes['import']:.0f} -> {despues['import']:.0f} ms "
+          f"({despues['import'] / antes['import'] - 1:+.0%})")
+    print(f"primera respuesta liviana: {antes['import'] + antes['metricas']:.0f} -> "
+          f"{despues['import'] + despues['metricas']:.0f} ms desde el inicio del proceso")
+
+    if args.detalle:
+        print("\nImports más costosos del escenario 'antes' (acumulado):")
+        for acumulado, nombre in imports_costosos():
+            print(f"  {nombre:<40}{acumulado / 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
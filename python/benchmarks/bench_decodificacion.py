@@ -0,0 +1,79 @@
+"""Tiempo y memoria pico por hoja según el modo de decodificación.
+
+Modos (OMR_DECODIFICACION):
+    color     decodificación en color a resolución completa (comportamiento previo)
+    gris      decodificación directa en gris a resolución completa
+    reducida  gris con reducción JPEG 1/2, 1/4 u 1/8 según la resolución
+
+Cada modo corre en un proceso nuevo para que el RSS pico (ru_maxrss) sea
+comparable. Se reporta el incremento de RSS sobre el proceso ya inicializado.
+
+Uso (desde la carpeta python/):
+    python benchmarks/bench_decodificacion.py [--hojas N] [--lados 1056 2200 4000]
+"""
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MODOS = ("color", "gris", "reducida")
+
+
+def _medir_modo(modo, datos, respuestas, resultado):
+    import obtener_respuestas_estudiantes as omr
+
+    # Inicializa layout y rasgos de la plantilla (sobre la hoja en blanco) antes de medir
+    with open(os.path.join(RAIZ, "plantilla.jpg"), "rb") as f:
+        omr.calificar_imagen(omr.decodificar_hoja(f.read(), "gris"))
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    tiempos = []
+    aciertos = 0
+    for _ in range(resultado["hojas"]):
+        inicio = time.perf_counter()
+        gray = omr.decodificar_hoja(datos, modo)
+        leidas, _ = omr.calificar_imagen(gray)
+        tiempos.append(time.perf_counter() - inicio)
+        aciertos = sum(r["opcionseleccionada"] == esperada
+                       for r, esperada in zip(leidas, respuestas))
+
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    resultado.update(
+        ms=sorted(tiempos)[len(tiempos) // 2] * 1000,
+        rss_mb=max(0, pico - base) / 1024,
+        aciertos=aciertos,
+    )
+
+
+def main():
+    from generador_hojas import codificar, generar_hoja, respuestas_aleatorias
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hojas", type=int, default=10)
+    parser.add_argument("--lados", type=int, nargs="+", default=[1056, 2200, 4000])
+    args = parser.parse_args()
+
+    respuestas = respuestas_aleatorias(semilla=1)
+    ctx = mp.get_context("spawn")
+
+    print(f"{'lado (px)':>10}  {'modo':<9}{'ms/hoja':>9}{'RSS pico (MB)':>15}{'aciertos':>10}")
+    for lado in args.lados:
+        datos = codificar(generar_hoja(respuestas, lado=lado))
+        for modo in MODOS:
+            with ctx.Manager() as manager:
+                resultado = manager.dict(hojas=args.hojas)
+                proceso = ctx.Process(target=_medir_modo, args=(modo, datos, respuestas, resultado))
+                proceso.start()
+                proceso.join()
+                r = dict(resultado)
+            print(f"{lado:>10}  {modo:<9}{r['ms']:>9.1f}{r['rss_mb']:>15.1f}{r['aciertos']:>10}/100")
+
+
+if __name__ == "__main__":
+    main()
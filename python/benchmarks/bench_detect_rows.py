@@ -0,0 +1,212 @@
+"""Micro-benchmark de detect_rows: implementación con bucles vs. vectorizada.
+
+Compara la versión anterior (bucles de Python sobre la proyección) con la
+actual de obtener_respuestas_estudiantes sobre columnas sintéticas de distintas
+alturas y sobre las columnas reales de plantilla.jpg, y verifica que ambas
+devuelvan exactamente las mismas 25 filas.
+
+Uso (desde la carpeta python/):
+    python benchmarks/bench_detect_rows.py [--repeticiones N]
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from obtener_respuestas_estudiantes import (  # noqa: E402
+    GRIS_MARCO, cluster_peaks, detect_columns, detect_rows, find_peaks, frame_column,
+)
+
+
+def suavizar(col_img):
+    """Proyección suavizada de la columna (etapa común a ambas versiones)."""
+    gray = col_img if col_img.ndim == 2 else cv2.cvtColor(col_img, cv2.COLOR_BGR2GRAY)
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+
+    projection = np.sum(thresh, axis=1) / 255
+    h = col_img.shape[0]
+
+    kernel_size = max(3, h // 100)
+    kernel = np.ones(kernel_size) / kernel_size
+    return np.convolve(projection, kernel, mode='same')
+
+
+def picos_referencia(smoothed, h):
+    """Búsqueda de picos y agrupamiento con bucles, como estaba antes."""
+    peaks = []
+    threshold = np.mean(smoothed) * 0.8
+    for i in range(1, len(smoothed)-1):
+        if smoothed[i] > threshold and smoothed[i] > smoothed[i-1] and smoothed[i] > smoothed[i+1]:
+            peaks.append(i)
+
+    if len(peaks) < 20:
+        return None
+
+    clustered = []
+    cluster_thresh = h // 50
+    current_cluster = []
+    for peak in sorted(peaks):
+        if not current_cluster:
+            current_cluster.append(peak)
+        else:
+            if peak - current_cluster[0] < cluster_thresh:
+                current_cluster.append(peak)
+            else:
+                clustered.append(int(np.mean(current_cluster)))
+                current_cluster = [peak]
+    if current_cluster:
+        clustered.append(int(np.mean(current_cluster)))
+
+    return sorted(clustered)
+
+
+def picos_vectorizado(smoothed, h):
+    """Misma etapa con find_peaks y cluster_peaks."""
+    peaks = find_peaks(smoothed, np.mean(smoothed) * 0.8)
+    if len(peaks) < 20:
+        return None
+    return cluster_peaks(peaks, h // 50).tolist()
+
+
+def detect_rows_referencia(col_img):
+    """detect_rows tal como estaba antes de vectorizarla (búsqueda de picos y
+    agrupamiento con bucles de Python)."""
+    h = col_img.shape[0]
+    clustered = picos_referencia(suavizar(col_img), h)
+    if clustered is None:
+        return detect_rows_fallback_referencia(col_img)
+
+    start_index = 0
+    for i, peak in enumerate(clustered):
+        if peak > h * 0.1:
+            start_index = i
+            break
+
+    if len(clustered) - start_index < 25:
+        return detect_rows_fallback_referencia(col_img)
+
+    clustered = clustered[start_index:start_index+25]
+
+    rows = []
+    for i in range(25):
+        center = clustered[i]
+        y0 = center - h//70
+        y1 = center + h//70
+
+        if i == 0:
+            y0 = max(0, center - h//60)
+        elif i == 24:
+            y1 = min(h, center + h//60)
+
+        if i > 0 and y0 < rows[i-1][1]:
+            y0 = rows[i-1][1] + 1
+
+        rows.append((int(y0), int(y1)))
+
+    return rows
+
+
+def detect_rows_fallback_referencia(col_img):
+    h = col_img.shape[0]
+
+    gray = col_img if col_img.ndim == 2 else cv2.cvtColor(col_img, cv2.COLOR_BGR2GRAY)
+    _, thresh = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY_INV)
+    projection = np.sum(thresh, axis=1) / 255
+
+    start_index = 0
+    threshold = np.max(projection) * 0.1
+    for i in range(len(projection)):
+        if projection[i] > threshold:
+            start_index = i
+            break
+
+    height_available = h - start_index
+    row_h = height_available / 25.0
+
+    rows = []
+    for i in range(25):
+        y0 = int(start_index + i * row_h)
+        y1 = int(start_index + (i+1) * row_h)
+        rows.append((y0, y1))
+    return rows
+
+
+def columna_sintetica(alto, ancho=None, ruido=8.0, semilla=0):
+    """Columna en gris con 25 filas de 5 burbujas y número de pregunta."""
+    rng = np.random.default_rng(semilla)
+    ancho = ancho or max(120, alto // 5)
+    col = np.full((alto, ancho), 255, np.uint8)
+    radio = max(3, alto // 110)
+    margen_sup = int(alto * 0.12)
+    paso = (alto - margen_sup - 2 * radio) / 25
+    for fila in range(25):
+        cy = int(margen_sup + radio + fila * paso)
+        cv2.putText(col, f"{fila + 1}.", (4, cy + radio // 2), cv2.FONT_HERSHEY_SIMPLEX,
+                    radio / 12, 0, max(1, radio // 6))
+        for opcion in range(5):
+            cx = int(ancho * 0.25 + opcion * ancho * 0.15)
+            relleno = -1 if rng.random() < 0.15 else max(1, radio // 5)
+            cv2.circle(col, (cx, cy), radio, 0, relleno)
+    ruido_img = rng.normal(0, ruido, col.shape)
+    return np.clip(col + ruido_img, 0, 255).astype(np.uint8)
+
+
+def columnas_reales():
+    img = cv2.imread(os.path.join(RAIZ, "plantilla.jpg"), cv2.IMREAD_GRAYSCALE)
+    columnas = []
+    for ci, (xs, ys, w, h) in enumerate(detect_columns(img)):
+        col = img[ys:ys+h, xs:xs+w].copy()
+        frame_column(col, ci, (0, 0, w, h), GRIS_MARCO)
+        columnas.append((f"plantilla.jpg C{ci+1}", col))
+    return columnas
+
+
+def medir(funcion, repeticiones, *args):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion(*args)
+    return (time.perf_counter() - inicio) / repeticiones * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=50)
+    args = parser.parse_args()
+
+    casos = columnas_reales()
+    for alto in (1000, 2000, 4000, 8000):
+        casos.append((f"sintética {alto}px", columna_sintetica(alto, semilla=alto)))
+
+    print("Tiempos en ms; 'picos' es solo la búsqueda de picos y el agrupamiento,")
+    print("'total' es detect_rows completa (incluye blur, Otsu y proyección).\n")
+    print(f"{'columna':<22}{'picos antes':>12}{'picos ahora':>12}{'x':>7}"
+          f"{'total antes':>13}{'total ahora':>13}  filas")
+    iguales = True
+    for nombre, col in casos:
+        h = col.shape[0]
+        smoothed = suavizar(col)
+        referencia = detect_rows_referencia(col)
+        actual = detect_rows(col)
+        coincide = (referencia == actual and len(actual) == 25
+                    and picos_referencia(smoothed, h) == picos_vectorizado(smoothed, h))
+        iguales &= coincide
+        picos_antes = medir(picos_referencia, args.repeticiones, smoothed, h)
+        picos_ahora = medir(picos_vectorizado, args.repeticiones, smoothed, h)
+        total_antes = medir(detect_rows_referencia, args.repeticiones, col)
+        total_ahora = medir(detect_rows, args.repeticiones, col)
+        print(f"{nombre:<22}{picos_antes:>12.3f}{picos_ahora:>12.3f}{picos_antes / picos_ahora:>7.1f}"
+              f"{total_antes:>13.3f}{total_ahora:>13.3f}  {'iguales' if coincide else 'DISTINTAS'}")
+
+    if not iguales:
+        sys.exit("Las implementaciones no devuelven las mismas filas")
+
+
+if __name__ == "__main__":
+    main()
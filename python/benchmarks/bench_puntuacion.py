@@ -0,0 +1,82 @@
+"""Tiempo de puntuar una promoción: bucle por estudiante vs matriz NumPy.
+
+El bucle reproduce la puntuación por diccionarios que usaba /procesar-simulacro;
+la versión vectorizada es puntuacion_cohorte.puntuar_cohorte; la última columna
+incluye además armar las listas de errores por curso. Ambas deben dar los
+mismos puntajes.
+
+Uso (desde la carpeta python/):
+    python benchmarks/bench_puntuacion.py [--estudiantes 100 1000 5000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from puntuacion_cohorte import (DESCUENTO_INCORRECTA, OPCIONES, PUNTAJE_CORRECTA, listas_errores,
+                                puntuar_cohorte, vector_clave, vector_cursos)
+
+PREGUNTAS = 100
+CURSOS = 12
+
+
+def puntuar_bucle(respuestas, clave, curso_por_pregunta):
+    total = {"correctas": 0, "incorrectas": 0, "enblanco": 0}
+    por_curso = {}
+    for numero, opcion in enumerate(respuestas, start=1):
+        if opcion is None:
+            resultado = "enblanco"
+        elif clave.get(numero) == opcion:
+            resultado = "correctas"
+        else:
+            resultado = "incorrectas"
+        total[resultado] += 1
+        curso = por_curso.setdefault(curso_por_pregunta[numero],
+                                     {"correctas": 0, "incorrectas": 0, "enblanco": 0, "lista_errores": []})
+        curso[resultado] += 1
+        if resultado != "correctas":
+            curso["lista_errores"].append(numero)
+    total["puntaje"] = total["correctas"] * PUNTAJE_CORRECTA - total["incorrectas"] * DESCUENTO_INCORRECTA
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--estudiantes", type=int, nargs="+", default=[100, 1000, 5000])
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    preguntas = [{"numeropregunta": n, "idcurso": 1 + (n - 1) * CURSOS // PREGUNTAS,
+                  "nombrecurso": f"Curso {1 + (n - 1) * CURSOS // PREGUNTAS}"} for n in range(1, PREGUNTAS + 1)]
+    clave = {n: rng.choice(OPCIONES) for n in range(1, PREGUNTAS + 1)}
+    curso_por_pregunta = {p["numeropregunta"]: p["idcurso"] for p in preguntas}
+    cursos, curso_idx = vector_cursos(preguntas, PREGUNTAS)
+    vector = vector_clave([{"numeropregunta": n, "opcioncorrecta": o} for n, o in clave.items()], PREGUNTAS)
+
+    print(f"{'estudiantes':>12}{'bucle (ms)':>12}{'NumPy (ms)':>12}{'+ errores (ms)':>16}")
+    for total in args.estudiantes:
+        matriz = np.random.default_rng(total).integers(0, len(OPCIONES) + 1, (total, PREGUNTAS), dtype=np.uint8)
+        hojas = [[OPCIONES[c - 1] if c else None for c in fila] for fila in matriz.tolist()]
+
+        inicio = time.perf_counter()
+        esperados = [puntuar_bucle(h, clave, curso_por_pregunta) for h in hojas]
+        ms_bucle = (time.perf_counter() - inicio) * 1000
+
+        inicio = time.perf_counter()
+        resultado = puntuar_cohorte(matriz, vector, curso_idx, cursos)
+        ms_numpy = (time.perf_counter() - inicio) * 1000
+        listas_errores(resultado)
+        ms_errores = (time.perf_counter() - inicio) * 1000
+
+        assert np.allclose(resultado.puntaje, [e["puntaje"] for e in esperados])
+        print(f"{total:>12}{ms_bucle:>12.1f}{ms_numpy:>12.1f}{ms_errores:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Aciertos con umbral fijo vs adaptativo sobre hojas sintéticas etiquetadas.
+
+Genera hojas con respuestas conocidas y las pasa por dos tipos de escaneo
+simulado: más oscuros o más claros (contraste y brillo), en la mitad de los
+casos con marcas de lápiz de intensidad variable, y con inclinación y ruido
+de sensor (escanear), donde las marcas quedan corridas respecto de la
+plantilla. Cada hoja se lee una sola vez y el mismo vector de rellenos se
+decide en modo fijo y en modo adaptativo (decide_answers).
+
+Uso (desde la carpeta python/):
+    python benchmarks/bench_umbral.py [--hojas 6]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import obtener_respuestas_estudiantes as omr  # noqa: E402
+from generador_hojas import (ajustar_escaneo, codificar, escanear, generar_hoja,  # noqa: E402
+                             respuestas_aleatorias)
+
+# (contraste, brillo) de cada escaneo simulado
+ESCANEOS = [(0.75, -40), (0.85, -20), (0.9, -10), (1.0, 0), (1.1, 20), (1.15, 30)]
+# (DPI, inclinación en grados, ruido) de los escaneos con marcas corridas
+ESCANEOS_INCLINADOS = [(200, 1.5, 10), (200, 3.0, 20), (150, 3.0, 10), (300, 1.5, 20), (300, 3.0, 20)]
+# Gris de las marcas de lápiz claro: de casi negro a gris medio
+TONOS_LAPIZ = (30, 120)
+
+
+def aciertos(fill, respuestas, modo):
+    _, seleccion = omr.decide_answers(fill, modo)
+    return sum((omr.OPCIONES[s] if s >= 0 else None) == r for s, r in zip(seleccion.tolist(), respuestas))
+
+
+def casos(hojas):
+    """(etiqueta, [(respuestas, hoja), ...]) de cada escaneo simulado."""
+    rng = np.random.default_rng(0)
+    semilla = 0
+    for contraste, brillo in ESCANEOS:
+        for lapiz in (False, True):
+            lote = []
+            for _ in range(hojas):
+                respuestas = respuestas_aleatorias(semilla=semilla)
+                semilla += 1
+                tonos = rng.integers(*TONOS_LAPIZ, len(respuestas)) if lapiz else None
+                lote.append((respuestas, ajustar_escaneo(generar_hoja(respuestas, tonos=tonos), contraste, brillo)))
+            yield f"contraste {contraste:.2f} brillo {brillo:+.0f} {'lápiz' if lapiz else 'negras'}", lote
+    for dpi, inclinacion, ruido in ESCANEOS_INCLINADOS:
+        lote = []
+        for _ in range(hojas):
+            respuestas = respuestas_aleatorias(semilla=semilla)
+            lote.append((respuestas, escanear(generar_hoja(respuestas), dpi, inclinacion, ruido, semilla)))
+            semilla += 1
+        yield f"{dpi} dpi inclinación {inclinacion:.1f}° ruido {ruido}", lote
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hojas", type=int, default=6, help="hojas por caso")
+    args = parser.parse_args()
+
+    print(f"{'escaneo':<38}{'fijo':>8}{'adaptativo':>12}{'umbral medio':>14}")
+    totales = {"fijo": [], "adaptativo": []}
+    ms_umbral = []
+    for etiqueta, lote in casos(args.hojas):
+        fila = {"fijo": [], "adaptativo": []}
+        umbrales = []
+        for respuestas, hoja in lote:
+            fill, _, _, _ = omr.leer_imagen(omr.decodificar_hoja(codificar(hoja)))
+
+            inicio = time.perf_counter()
+            umbral, _ = omr.decide_answers(fill, "adaptativo")
+            ms_umbral.append((time.perf_counter() - inicio) * 1000)
+            umbrales.append(umbral)
+            for modo in fila:
+                fila[modo].append(aciertos(fill, respuestas, modo))
+
+        for modo in fila:
+            totales[modo].extend(fila[modo])
+        print(f"{etiqueta:<38}{np.mean(fila['fijo']):>8.1f}{np.mean(fila['adaptativo']):>12.1f}{np.mean(umbrales):>14.1f}")
+
+    print(f"{'total (aciertos de 100)':<38}{np.mean(totales['fijo']):>8.2f}{np.mean(totales['adaptativo']):>12.2f}")
+    print(f"{'peor hoja':<38}{np.min(totales['fijo']):>8.0f}{np.min(totales['adaptativo']):>12.0f}")
+    print(f"decisión adaptativa: {np.median(ms_umbral):.2f} ms por hoja (mediana)")
+
+
+if __name__ == "__main__":
+    main()
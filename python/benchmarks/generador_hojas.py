@@ -0,0 +1,85 @@
+"""Generador de hojas de respuestas sintéticas con respuestas conocidas.
+
+Rellena las burbujas de plantilla.jpg según una lista de respuestas y, si se
+pide, reescala la hoja para simular escaneos de mayor resolución o cambia su
+brillo y contraste para simular escaneos más oscuros o más claros. escanear()
+combina resolución (DPI), inclinación y ruido de sensor.
+"""
+import os
+import sys
+
+import cv2
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from registro_plantillas import PLANTILLAS, detectar_burbujas  # noqa: E402
+
+OPCIONES = "ABCDE"
+# plantilla.jpg es una hoja carta (8.5 x 11 pulgadas) de 816 x 1056 px
+PLANTILLA_DPI = 96
+
+
+def respuestas_aleatorias(semilla=0, preguntas=100, prob_blanco=0.15):
+    """Lista de respuestas ('A'..'E' o None) reproducible por semilla."""
+    rng = np.random.default_rng(semilla)
+    return [None if rng.random() < prob_blanco else OPCIONES[rng.integers(5)]
+            for _ in range(preguntas)]
+
+
+def generar_hoja(respuestas, lado=None, id_plantilla="plantilla", tonos=None):
+    """Devuelve la hoja en color (BGR) con las burbujas de `respuestas` rellenas.
+
+    `lado` es el lado mayor deseado en píxeles; por defecto el de la plantilla.
+    `tonos` da el gris (0..255) de la marca de cada pregunta para simular lápiz
+    claro; por defecto todas las marcas son casi negras.
+    """
+    hoja = cv2.imread(PLANTILLAS[id_plantilla], cv2.IMREAD_COLOR)
+    burbujas = detectar_burbujas(cv2.cvtColor(hoja, cv2.COLOR_BGR2GRAY))
+    for q, respuesta in enumerate(respuestas):
+        if respuesta is None:
+            continue
+        x0, y0, x1, y1 = burbujas[q, OPCIONES.index(respuesta)]
+        centro = ((x0 + x1) // 2, (y0 + y1) // 2)
+        radio = int(max(x1 - x0, y1 - y0) * 0.75)
+        tono = 30 if tonos is None else int(tonos[q])
+        cv2.circle(hoja, centro, radio, (tono, tono, tono), -1)
+
+    if lado is not None and lado != max(hoja.shape[:2]):
+        escala = lado / max(hoja.shape[:2])
+        hoja = cv2.resize(hoja, None, fx=escala, fy=escala, interpolation=cv2.INTER_CUBIC)
+    return hoja
+
+
+def ajustar_escaneo(hoja, contraste=1.0, brillo=0.0):
+    """Simula un escáner más oscuro o más claro: contraste * pixel + brillo."""
+    return cv2.convertScaleAbs(hoja, alpha=contraste, beta=brillo)
+
+
+def escanear(hoja, dpi=None, inclinacion=0.0, ruido=0.0, semilla=0):
+    """Simula el escaneo de la hoja generada.
+
+    `dpi` reescala desde PLANTILLA_DPI, `inclinacion` gira la hoja en grados
+    (con borde blanco, como el fondo del escáner) y `ruido` suma ruido
+    gaussiano con esa desviación en niveles de gris.
+    """
+    if dpi is not None and dpi != PLANTILLA_DPI:
+        escala = dpi / PLANTILLA_DPI
+        hoja = cv2.resize(hoja, None, fx=escala, fy=escala, interpolation=cv2.INTER_CUBIC)
+    if inclinacion:
+        h, w = hoja.shape[:2]
+        giro = cv2.getRotationMatrix2D((w / 2, h / 2), inclinacion, 1.0)
+        hoja = cv2.warpAffine(hoja, giro, (w, h), flags=cv2.INTER_LINEAR,
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=(255, 255, 255))
+    if ruido:
+        rng = np.random.default_rng(semilla)
+        hoja = np.clip(hoja + rng.normal(0, ruido, hoja.shape), 0, 255).astype(np.uint8)
+    return hoja
+
+
+def codificar(hoja, formato=".jpg", calidad=90):
+    ok, buffer = cv2.imencode(formato, hoja, [cv2.IMWRITE_JPEG_QUALITY, calidad])
+    if not ok:
+        raise ValueError(f"No se pudo codificar la hoja como {formato}")
+    return buffer.tobytes()
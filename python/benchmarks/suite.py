@@ -0,0 +1,250 @@
+"""Suite de rendimiento y precisión de todas las etapas del servicio.
+
+Mide, sobre los archivos incluidos en python/ (plantilla.jpg,
+simulacro_area_b_01.pdf, Respuestas_Simulacros.xlsx, cursos_examen.json) y
+sobre hojas sintéticas de generador_hojas:
+
+- tiempo por etapa (mediana de varias repeticiones, en ms);
+- memoria pico por etapa (tracemalloc: memoria de Python y NumPy; los búferes
+  internos de OpenCV y PyMuPDF no se ven ahí, por eso al final se reporta
+  también el RSS máximo del proceso);
+- precisión de la calificación con respuestas conocidas a distintos DPI,
+  niveles de ruido e inclinaciones, y resultados de control de las demás
+  etapas (preguntas con curso asignado, claves leídas, etc.).
+
+Los números se comparan con benchmarks/linea_base.json; --guardar la
+reescribe con la corrida actual. Un tiempo o memoria por encima de la
+tolerancia, una precisión menor o un resultado de control distinto se
+marcan como regresión (con --estricto, además, el código de salida es 1).
+
+Uso (desde la carpeta python/):
+    python benchmarks/suite.py [--rapido] [--guardar] [--estricto] [--tolerancia 0.25] [--margen-ms 2]
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+LINEA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "linea_base.json")
+
+# Rejilla de hojas sintéticas para la precisión
+DPIS = (150, 200, 300)
+RUIDOS = (0, 10, 20)
+INCLINACIONES = (0.0, 1.5, 3.0)
+# Fijo para que la precisión se compare siempre sobre las mismas hojas
+HOJAS_POR_CASO = 2
+
+
+def leer(nombre, modo="rb"):
+    with open(os.path.join(RAIZ, nombre), modo) as f:
+        return f.read()
+
+
+def medir(funcion, repeticiones):
+    """Mediana del tiempo (ms) y memoria pico con tracemalloc (KB) de `funcion`."""
+    funcion()  # calentamiento: cachés, layouts, imports perezosos
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    tracemalloc.start()
+    funcion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"ms": round(float(np.median(tiempos)), 3), "mem_kb": round(pico / 1024, 1)}
+
+
+def etapas(repeticiones):
+    """Tiempo y memoria de cada etapa, y resultados de control."""
+    import cv2
+    import fitz
+    import obtener_respuestas_estudiantes as omr
+    from clasificador_temas import extraer_textos_preguntas
+    from generador_hojas import codificar, escanear, generar_hoja, respuestas_aleatorias
+    from obtener_respuestas_admin import cargar_respuestas_correctas
+    from orden_cursos_simulacros import MatcherCursos, ordenar_cursos, procesar_pagina_con_texto, procesar_paginas
+    from puntuacion_cohorte import listas_errores, puntuar_cohorte
+
+    excel = leer("Respuestas_Simulacros.xlsx")
+    pdf = leer("simulacro_area_b_01.pdf")
+    cursos_data = json.loads(leer("cursos_examen.json", "r"))
+    matcher = MatcherCursos([c["nombrecurso"] for c in cursos_data["data"]])
+    with fitz.open(stream=pdf, filetype="pdf") as documento:
+        total_paginas = len(documento)
+        # Un número en negrita en el enunciado ("250.") no debe extender el examen
+        pagina = documento[total_paginas // 2]
+        pagina.insert_text((60, pagina.rect.height - 40), "250. En el año 250 a. C.", fontname="hebo", fontsize=10)
+        pdf_numero_atipico = documento.tobytes()
+
+    hoja = codificar(escanear(generar_hoja(respuestas_aleatorias(semilla=1)), dpi=200))
+    gris = omr.decodificar_hoja(hoja)
+    plantilla = cv2.imread(os.path.join(RAIZ, "plantilla.jpg"), cv2.IMREAD_GRAYSCALE)
+    columnas = omr.detect_columns(plantilla)
+
+    def paginas_con_texto():
+        with fitz.open(stream=pdf, filetype="pdf") as documento:
+            for pagina in documento:
+                procesar_pagina_con_texto(pagina, matcher)
+
+    def filas_plantilla():
+        for xs, ys, w, h in columnas:
+            omr.detect_rows(plantilla[ys:ys+h, xs:xs+w])
+
+    matriz = np.random.default_rng(0).integers(0, 6, (1000, 100), dtype=np.uint8)
+    clave = np.random.default_rng(1).integers(1, 6, 100, dtype=np.uint8)
+    curso_idx = (np.arange(100) * 12 // 100).astype(np.int32)
+    cursos = [(k, f"Curso {k}") for k in range(12)]
+
+    def cohorte():
+        listas_errores(puntuar_cohorte(matriz, clave, curso_idx, cursos))
+
+    medidas = {
+        "admin.cargar_respuestas": lambda: cargar_respuestas_correctas(excel, "Respuestas_Simulacros.xlsx"),
+        "pdf.procesar_pagina_con_texto": paginas_con_texto,
+        "pdf.procesar_paginas": lambda: procesar_paginas(pdf, range(total_paginas), matcher),
+        "pdf.ordenar_cursos": lambda: asyncio.run(ordenar_cursos(pdf, cursos_data)),
+        "pdf.textos_preguntas": lambda: extraer_textos_preguntas(pdf),
+        "omr.decodificar_hoja": lambda: omr.decodificar_hoja(hoja),
+        "omr.leer_imagen": lambda: omr.leer_imagen(gris),
+        "omr.detect_rows": filas_plantilla,
+        "omr.analyze_rows": lambda: omr.analyze_rows(plantilla, columnas),
+        "omr.leer_hoja": lambda: omr.leer_hoja(hoja),
+        "cohorte.puntuar_1000": cohorte,
+    }
+    resultados_etapas = {}
+    for nombre, funcion in medidas.items():
+        resultados_etapas[nombre] = medir(funcion, repeticiones)
+        print(f"  {nombre:<32}{resultados_etapas[nombre]['ms']:>10.2f} ms{resultados_etapas[nombre]['mem_kb']:>12.1f} KB")
+
+    preguntas = asyncio.run(ordenar_cursos(pdf, cursos_data))
+    control = {
+        "admin.respuestas": len(cargar_respuestas_correctas(excel, "Respuestas_Simulacros.xlsx")),
+        "pdf.preguntas": len(preguntas),
+        "pdf.preguntas_con_curso": sum(p["idcurso"] != "" for p in preguntas),
+        "pdf.preguntas_con_numero_atipico": len(asyncio.run(ordenar_cursos(pdf_numero_atipico, cursos_data))),
+        "pdf.textos_preguntas": len(extraer_textos_preguntas(pdf)),
+        "omr.plantilla_en_blanco": int((omr.leer_hoja(leer("plantilla.jpg"))[0].codigos == 0).sum()),
+    }
+    return resultados_etapas, control
+
+
+def precision(hojas_por_caso):
+    """Porcentaje de respuestas leídas correctamente por DPI, ruido e inclinación."""
+    import obtener_respuestas_estudiantes as omr
+    from generador_hojas import OPCIONES, codificar, escanear, generar_hoja, respuestas_aleatorias
+
+    por_dimension = {f"dpi={d}": [] for d in DPIS}
+    por_dimension.update({f"ruido={r}": [] for r in RUIDOS})
+    por_dimension.update({f"inclinacion={i}": [] for i in INCLINACIONES})
+    todos = []
+    semilla = 0
+    for dpi in DPIS:
+        for ruido in RUIDOS:
+            for inclinacion in INCLINACIONES:
+                for _ in range(hojas_por_caso):
+                    respuestas = respuestas_aleatorias(semilla=semilla)
+                    hoja = escanear(generar_hoja(respuestas), dpi, inclinacion, ruido, semilla)
+                    semilla += 1
+                    lectura, _ = omr.leer_hoja(codificar(hoja))
+                    leidas = [OPCIONES[c - 1] if c else None for c in lectura.codigos.tolist()]
+                    aciertos = 100 * np.mean([l == r for l, r in zip(leidas, respuestas)])
+                    todos.append(aciertos)
+                    for clave in (f"dpi={dpi}", f"ruido={ruido}", f"inclinacion={inclinacion}"):
+                        por_dimension[clave].append(aciertos)
+
+    resultado = {clave: round(float(np.mean(v)), 2) for clave, v in por_dimension.items()}
+    resultado["total"] = round(float(np.mean(todos)), 2)
+    resultado["peor_hoja"] = round(float(np.min(todos)), 2)
+    for clave, valor in resultado.items():
+        print(f"  {clave:<32}{valor:>10.2f} %")
+    return resultado
+
+
+def comparar(actual, base, tolerancia, margen_ms):
+    """Lista de regresiones de `actual` contra la línea base."""
+    regresiones = []
+    print("\nComparación con la línea base:")
+    for nombre, medida in actual["etapas"].items():
+        previa = base.get("etapas", {}).get(nombre)
+        if previa is None:
+            continue
+        for campo in ("ms", "mem_kb"):
+            if not previa[campo]:
+                continue
+            cambio = medida[campo] / previa[campo] - 1
+            marca = ""
+            if cambio > tolerancia and (campo != "ms" or medida[campo] - previa[campo] > margen_ms):
+                marca = "  <- REGRESIÓN"
+                regresiones.append(f"{nombre}.{campo}")
+            print(f"  {nombre + '.' + campo:<40}{previa[campo]:>10.2f} -> {medida[campo]:>10.2f}  ({cambio:+.0%}){marca}")
+
+    for clave, valor in actual["precision"].items():
+        previo = base.get("precision", {}).get(clave)
+        if previo is not None and valor < previo:
+            regresiones.append(f"precision.{clave}")
+            print(f"  precision.{clave:<30}{previo:>10.2f} -> {valor:>10.2f}  <- REGRESIÓN")
+
+    for clave, valor in actual["control"].items():
+        previo = base.get("control", {}).get(clave)
+        if previo is not None and valor != previo:
+            regresiones.append(f"control.{clave}")
+            print(f"  control.{clave:<32}{previo!s:>10} -> {valor!s:>10}  <- CAMBIO")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rapido", action="store_true", help="menos repeticiones por etapa")
+    parser.add_argument("--guardar", action="store_true", help="reescribe la línea base con esta corrida")
+    parser.add_argument("--estricto", action="store_true", help="código de salida 1 si hay regresiones")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="aumento relativo de tiempo o memoria aceptado (0.25 = 25%%)")
+    parser.add_argument("--margen-ms", type=float, default=2.0,
+                        help="aumento absoluto de tiempo que se ignora en etapas muy cortas")
+    args = parser.parse_args()
+
+    repeticiones = 3 if args.rapido else 10
+
+    print("Etapas (mediana, memoria pico):")
+    resultados_etapas, control = etapas(repeticiones)
+    print("\nPrecisión de calificación (hojas sintéticas):")
+    resultado_precision = precision(HOJAS_POR_CASO)
+    print("\nResultados de control:")
+    for clave, valor in control.items():
+        print(f"  {clave:<32}{valor:>10}")
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\nRSS máximo del proceso: {rss_mb:.0f} MB")
+
+    actual = {"etapas": resultados_etapas, "precision": resultado_precision, "control": control}
+    if args.guardar:
+        with open(LINEA_BASE, "w", encoding="utf-8") as f:
+            json.dump(actual, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"Línea base guardada en {LINEA_BASE}")
+        return
+
+    if not os.path.exists(LINEA_BASE):
+        print("No hay línea base; ejecute con --guardar para crearla.")
+        return
+    with open(LINEA_BASE, encoding="utf-8") as f:
+        base = json.load(f)
+    regresiones = comparar(actual, base, args.tolerancia, args.margen_ms)
+    print(f"\n{len(regresiones)} regresiones" + (": " + ", ".join(regresiones) if regresiones else ""))
+    if regresiones and args.estricto:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import threading
+from cachetools import LRUCache
+from fastapi import APIRouter
+
+# Configuración de la caché de resultados (variables de entorno)
+CACHE_MAX_ENTRADAS = max(1, int(os.environ.get("CACHE_MAX_ENTRADAS", 256)))
+# Carpeta del nivel en disco; vacío lo desactiva.
+CACHE_DIR = os.environ.get("CACHE_DIR", "")
+CACHE_MAX_MB = float(os.environ.get("CACHE_MAX_MB", 256))
+
+router = APIRouter()
+
+def clave_contenido(*partes):
+    """SHA-256 de los bytes (o textos) dados, en orden."""
+    h = hashlib.sha256()
+    for parte in partes:
+        if isinstance(parte, str):
+            parte = parte.encode("utf-8")
+        # Prefijo de longitud para que ("ab", "c") y ("a", "bc") no coincidan
+        h.update(len(parte).to_bytes(8, "little"))
+        h.update(parte)
+    return h.hexdigest()
+
+class CacheResultados:
+    """Caché direccionada por contenido con un nivel LRU en memoria y otro
+    opcional en disco.
+
+    Los valores deben ser serializables a JSON. En disco cada entrada es un
+    archivo `<clave>.json`; cuando el total supera `max_bytes` se eliminan los
+    menos usados recientemente (por fecha de modificación, que se actualiza en
+    cada acierto).
+    """
+
+    def __init__(self, nombre, max_entradas=CACHE_MAX_ENTRADAS, directorio=CACHE_DIR,
+                 max_bytes=int(CACHE_MAX_MB * 1024 * 1024)):
+        self.nombre = nombre
+        self.memoria = LRUCache(maxsize=max_entradas)
+        self.directorio = os.path.join(directorio, nombre) if directorio else None
+        self.max_bytes = max_bytes
+        self.aciertos_memoria = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+        if self.directorio:
+            os.makedirs(self.directorio, exist_ok=True)
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.json")
+
+    def obtener(self, clave):
+        """Valor guardado para `clave`, o None si no está en ningún nivel."""
+        with self._lock:
+            valor = self.memoria.get(clave)
+            if valor is not None:
+                self.aciertos_memoria += 1
+                return valor
+
+        valor = self._leer_disco(clave)
+        with self._lock:
+            if valor is None:
+                self.fallos += 1
+                return None
+            self.aciertos_disco += 1
+            self.memoria[clave] = valor
+            return valor
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self.memoria[clave] = valor
+        self._escribir_disco(clave, valor)
+
+    def _leer_disco(self, clave):
+        if not self.directorio:
+            return None
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, "r", encoding="utf-8") as f:
+                valor = json.load(f)
+            os.utime(ruta)
+            return valor
+        except (OSError, ValueError):
+            return None
+
+    def _escribir_disco(self, clave, valor):
+        if not self.directorio:
+            return
+        ruta = self._ruta(clave)
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(valor, f, ensure_ascii=False)
+            os.replace(temporal, ruta)
+            self._desalojar_disco()
+        except OSError:
+            # El disco es solo un nivel extra: si falla, se sigue con la memoria
+            if os.path.exists(temporal):
+                os.remove(temporal)
+
+    def _desalojar_disco(self):
+        entradas = []
+        total = 0
+        with os.scandir(self.directorio) as it:
+            for e in it:
+                if e.name.endswith(".json"):
+                    st = e.stat()
+                    entradas.append((st.st_mtime, st.st_size, e.path))
+                    total += st.st_size
+        for _, tamano, ruta in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(ruta)
+                total -= tamano
+            except OSError:
+                pass
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos_memoria + self.aciertos_disco + self.fallos
+            return {
+                "entradas_memoria": len(self.memoria),
+                "aciertos_memoria": self.aciertos_memoria,
+                "aciertos_disco": self.aciertos_disco,
+                "fallos": self.fallos,
+                "tasa_aciertos": (self.aciertos_memoria + self.aciertos_disco) / consultas if consultas else 0.0,
+                "disco": self.directorio is not None,
+            }
+
+# Cachés por ruta
+cache_respuestas_admin = CacheResultados("respuestas_admin")
+cache_orden_cursos = CacheResultados("orden_cursos")
+cache_clasificacion_temas = CacheResultados("clasificacion_temas")
+cache_textos_preguntas = CacheResultados("textos_preguntas")
+
+CACHES = {c.nombre: c for c in (cache_respuestas_admin, cache_orden_cursos, cache_clasificacion_temas,
+                                cache_textos_preguntas)}
+
+@router.get("/cache-resultados")
+async def estadisticas_cache():
+    return {"success": True, "data": {nombre: c.estadisticas() for nombre, c in CACHES.items()}}
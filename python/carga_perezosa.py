@@ -0,0 +1,85 @@
+import asyncio
+import importlib
+import os
+import traceback
+from fastapi import FastAPI, Request
+
+# Precalentar al iniciar (variable de entorno): tras el arranque importa en
+# segundo plano todos los routers, segmenta un PDF mínimo y lee la plantilla
+# en blanco en cada proceso del pool.
+CALENTAR_AL_INICIO = os.environ.get("CALENTAR_AL_INICIO", "0") != "0"
+
+# Rutas que necesitan todos los routers cargados (documentación generada)
+RUTAS_DOCUMENTACION = ("/openapi.json", "/docs", "/redoc")
+
+class RoutersPerezosos:
+    """Importa el módulo de cada router en la primera petición a una de sus rutas.
+
+    `modulos` es {módulo: (rutas, ...)}; una ruta cubre también sus subrutas
+    (/imagenes-marcadas cubre /imagenes-marcadas/{id}). Cada módulo debe
+    exponer `router`.
+
+    La importación se hace en el event loop y no en un hilo: así el pool de
+    procesos nunca se crea (fork) a mitad de un import.
+    """
+
+    def __init__(self, app: FastAPI, modulos):
+        self.app = app
+        self.modulos = modulos
+        self.cargados = set()
+        self.calentado = False
+        self._calentamiento = None
+
+    def cargar(self, modulo):
+        if modulo in self.cargados:
+            return
+        self.app.include_router(importlib.import_module(modulo).router)
+        self.cargados.add(modulo)
+        # El esquema OpenAPI se cachea en el primer pedido; se regenera con las rutas nuevas
+        self.app.openapi_schema = None
+
+    def modulos_para(self, path):
+        if path in RUTAS_DOCUMENTACION:
+            return list(self.modulos)
+        return [modulo for modulo, rutas in self.modulos.items()
+                if any(path == ruta or path.startswith(ruta + "/") for ruta in rutas)]
+
+    async def cargar_para_peticion(self, request: Request, call_next):
+        """Middleware HTTP: carga los routers de la ruta pedida antes de enrutarla."""
+        for modulo in self.modulos_para(request.url.path):
+            self.cargar(modulo)
+        return await call_next(request)
+
+    async def calentar(self):
+        """Carga todos los routers y ejercita las rutas de PDF y OMR."""
+        for modulo in self.modulos:
+            self.cargar(modulo)
+            # Entre módulo y módulo se atienden las peticiones que hayan llegado
+            await asyncio.sleep(0)
+
+        import orden_cursos_simulacros
+        import obtener_respuestas_estudiantes
+        from pool_calificacion import OMR_WORKERS, obtener_executor
+
+        # Los PDF cortos se segmentan en este proceso
+        orden_cursos_simulacros.calentar()
+        await asyncio.sleep(0)
+        # Las hojas se califican en el pool; una lectura por proceso. Se envían
+        # sin control de admisión ni métricas para no contarlas como hojas.
+        executor = obtener_executor()
+        await asyncio.gather(*(asyncio.wrap_future(executor.submit(obtener_respuestas_estudiantes.calentar))
+                               for _ in range(OMR_WORKERS)))
+        self.calentado = True
+
+    def iniciar_calentamiento(self):
+        """Lanza calentar() en segundo plano; para el evento startup de la app."""
+        if CALENTAR_AL_INICIO and self._calentamiento is None:
+            self._calentamiento = asyncio.ensure_future(self._calentar_sin_fallar())
+
+    async def _calentar_sin_fallar(self):
+        # Un fallo del calentamiento no debe afectar al servicio: las rutas se
+        # siguen cargando en su primera petición
+        try:
+            await self.calentar()
+        except Exception:
+            traceback.print_exc()
@@ -0,0 +1,92 @@
+import os
+from collections import defaultdict
+import fitz  # PyMuPDF
+from metricas import etapa
+from orden_cursos_simulacros import FLAGS_TEXTO, PATRON_NUMERO_PREGUNTA, es_negrita
+
+# Clasificación local de preguntas por TF-IDF (variables de entorno)
+CLASIFICADOR_LOCAL = os.environ.get("CLASIFICADOR_LOCAL", "1") != "0"
+# Similitud coseno mínima del mejor tema y ventaja mínima sobre el segundo
+CLASIFICADOR_UMBRAL = float(os.environ.get("CLASIFICADOR_UMBRAL", 0.15))
+CLASIFICADOR_MARGEN = float(os.environ.get("CLASIFICADOR_MARGEN", 0.05))
+
+@etapa("pdf.textos_preguntas")
+def extraer_textos_preguntas(contenido_pdf):
+    """Texto de cada pregunta del PDF: {numeropregunta: texto}.
+
+    Una pregunta empieza en un span "N." en negrita y sigue, en orden de
+    lectura (página, columna, y0), hasta el inicio de la siguiente.
+    """
+    lineas = []
+    with fitz.open(stream=contenido_pdf, filetype="pdf") as pdf:
+        for pagina in pdf:
+            centro_x = pagina.rect.width / 2
+            for block in pagina.get_text("dict", flags=FLAGS_TEXTO)["blocks"]:
+                for line in block.get("lines", []):
+                    spans = line["spans"]
+                    texto = "".join(span["text"] for span in spans).strip()
+                    if not texto:
+                        continue
+                    numero = None
+                    for span in spans:
+                        m = PATRON_NUMERO_PREGUNTA.match(span["text"].strip())
+                        if m and es_negrita(span):
+                            numero = int(m.group(1))
+                            break
+                    x0, y0 = line["bbox"][:2]
+                    lineas.append(((pagina.number, 0 if x0 < centro_x else 1, y0), numero, texto))
+
+    textos = defaultdict(list)
+    actual = None
+    for _, numero, texto in sorted(lineas, key=lambda l: l[0]):
+        if numero is not None and numero >= 1:
+            actual = numero
+        if actual is not None:
+            textos[actual].append(texto)
+    return {n: " ".join(partes) for n, partes in textos.items()}
+
+def documento_tema(tema):
+    """Texto con el que se representa un tema: su nombre y sus palabras clave."""
+    return " ".join([tema["nombretema"]] + list(tema.get("palabras_clave") or []))
+
+def puntuar_temas(textos, cursos):
+    """Mejor tema de cada pregunta por similitud TF-IDF.
+
+    `cursos` es una lista de (numeros, temas) con temas como
+    {"idtema", "nombretema", "palabras_clave"}. Devuelve
+    {numero: (idtema, puntaje, ventaja_sobre_el_segundo)} para las preguntas
+    con texto. Los n-gramas de caracteres toleran plurales y conjugaciones
+    sin necesidad de lematizar.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import linear_kernel
+
+    preguntas = [(n, temas) for numeros, temas in cursos for n in numeros if textos.get(n) and temas]
+    if not preguntas:
+        return {}
+
+    docs_temas = {}
+    for _, temas in preguntas:
+        for tema in temas:
+            docs_temas.setdefault(tema["idtema"], documento_tema(tema))
+    ids_temas = list(docs_temas)
+    indice_tema = {idtema: i for i, idtema in enumerate(ids_temas)}
+
+    vectorizador = TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 5), strip_accents="unicode",
+                                   lowercase=True, sublinear_tf=True)
+    matriz = vectorizador.fit_transform([docs_temas[i] for i in ids_temas] + [textos[n] for n, _ in preguntas])
+    similitud = linear_kernel(matriz[len(ids_temas):], matriz[:len(ids_temas)])
+
+    resultado = {}
+    for fila, (n, temas) in enumerate(preguntas):
+        puntajes = sorted(((similitud[fila, indice_tema[t["idtema"]]], t["idtema"]) for t in temas),
+                          key=lambda p: (-p[0], p[1]))
+        mejor, idtema = puntajes[0]
+        segundo = puntajes[1][0] if len(puntajes) > 1 else 0.0
+        resultado[n] = (idtema, float(mejor), float(mejor - segundo))
+    return resultado
+
+def asignaciones_confiables(puntajes):
+    """Solo las asignaciones que superan el umbral y el margen: {numero: idtema}."""
+    return {n: idtema for n, (idtema, puntaje, ventaja) in puntajes.items()
+            if puntaje >= CLASIFICADOR_UMBRAL and ventaja >= CLASIFICADOR_MARGEN}
@@ -0,0 +1,317 @@
+import asyncio
+import io
+import os
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from metricas import contar, etapa, registro
+
+# Configuración del cliente del modelo generativo (variables de entorno)
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini")  # "gemini" | "local"
+LLM_MODELO = os.environ.get("LLM_MODELO", "gemini-1.5-flash")
+LLM_MAX_CONCURRENTES = max(1, int(os.environ.get("LLM_MAX_CONCURRENTES", 4)))
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 60))
+LLM_TIMEOUT_COLA = float(os.environ.get("LLM_TIMEOUT_COLA", 30))
+LLM_REINTENTOS = max(0, int(os.environ.get("LLM_REINTENTOS", 3)))
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", 1.0))
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", 20.0))
+LLM_CIRCUITO_FALLOS = max(1, int(os.environ.get("LLM_CIRCUITO_FALLOS", 5)))
+LLM_CIRCUITO_ESPERA = float(os.environ.get("LLM_CIRCUITO_ESPERA", 30.0))
+
+# Solo desde el entorno; sin ella el backend "gemini" no arranca
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
+
+class LLMNoDisponible(Exception):
+    """El modelo no acepta llamadas por ahora (circuito abierto o cola llena)."""
+
+    def __init__(self, mensaje, reintentar_en):
+        super().__init__(mensaje)
+        self.reintentar_en = reintentar_en
+
+class BackendGemini:
+    """Llamadas bloqueantes a Gemini; el cliente las corre en hilos."""
+
+    def __init__(self, modelo=LLM_MODELO, api_key=GEMINI_API_KEY):
+        if not api_key:
+            raise RuntimeError("GEMINI_API_KEY no está configurada; defínala o use LLM_BACKEND=local")
+        import google.generativeai as genai
+        from google.api_core import exceptions
+
+        genai.configure(api_key=api_key)
+        self.genai = genai
+        self.modelo = genai.GenerativeModel(modelo)
+        self.errores_limite = (exceptions.ResourceExhausted, exceptions.TooManyRequests,
+                               exceptions.ServiceUnavailable)
+
+    def subir_pdf(self, contenido, nombre):
+        return self.genai.upload_file(io.BytesIO(contenido), mime_type="application/pdf",
+                                      display_name=nombre)
+
+    def generar(self, partes, json_mode=False, timeout=None):
+        config = {"temperature": 0}
+        if json_mode:
+            config["response_mime_type"] = "application/json"
+        respuesta = self.modelo.generate_content(
+            partes,
+            generation_config=config,
+            request_options={"timeout": timeout} if timeout else None,
+            stream=False
+        )
+        return respuesta.text
+
+    def generar_stream(self, partes, timeout=None):
+        respuesta = self.modelo.generate_content(
+            partes,
+            generation_config={"temperature": 0},
+            request_options={"timeout": timeout} if timeout else None,
+            stream=True
+        )
+        return self._fragmentos(respuesta)
+
+    @staticmethod
+    def _fragmentos(respuesta):
+        try:
+            for fragmento in respuesta:
+                yield fragmento.text
+        finally:
+            # Al cerrar el iterador antes de tiempo se cancela el flujo gRPC
+            # subyacente, si lo hay, para no dejar la conexión abierta
+            cancelar = getattr(getattr(respuesta, "_iterator", None), "cancel", None)
+            if cancelar is not None:
+                cancelar()
+
+    def es_limite_tasa(self, error):
+        return isinstance(error, self.errores_limite)
+
+class BackendLocal:
+    """Respuestas deterministas sin red, para desarrollo y pruebas.
+
+    En modo JSON no clasifica nada; en texto devuelve una retroalimentación
+    fija que menciona los temas citados como ("Tema") en el prompt.
+    """
+
+    def subir_pdf(self, contenido, nombre):
+        return nombre
+
+    def generar(self, partes, json_mode=False, timeout=None):
+        if json_mode:
+            return '{"clasificacion": []}'
+        prompt = partes if isinstance(partes, str) else partes[0]
+        temas = list(dict.fromkeys(re.findall(r'\("([^"]+)"\)', prompt)))
+        if not temas:
+            return "Sigue practicando con los simulacros para reforzar lo aprendido."
+        return "Te recomendamos repasar " + ", ".join(f'"{t}"' for t in temas) + ". ¡Sigue así!"
+
+    def generar_stream(self, partes, timeout=None):
+        texto = self.generar(partes)
+        return iter(re.findall(r"\S+\s*", texto))
+
+    def es_limite_tasa(self, error):
+        return False
+
+class CircuitoLLM:
+    """Corta las llamadas tras `fallos_max` fallos seguidos durante `espera` s.
+
+    Pasado ese tiempo deja pasar una llamada de prueba: si resulta, se cierra;
+    si falla, se vuelve a abrir. Si la prueba no llega a hacerse (cola llena
+    o cancelada), soltar_prueba() deja pasar a la siguiente.
+    """
+
+    def __init__(self, fallos_max, espera):
+        self.fallos_max = fallos_max
+        self.espera = espera
+        self.fallos = 0
+        self.abierto_hasta = 0.0
+        self.prueba_en_curso = False
+
+    def verificar(self):
+        """Lanza LLMNoDisponible si el circuito está abierto; True si la llamada es la de prueba."""
+        if self.fallos < self.fallos_max:
+            return False
+        restante = self.abierto_hasta - time.monotonic()
+        if restante > 0 or self.prueba_en_curso:
+            raise LLMNoDisponible("Servicio de feedback no disponible, intente nuevamente",
+                                  reintentar_en=max(1, int(restante)))
+        self.prueba_en_curso = True
+        return True
+
+    def soltar_prueba(self):
+        self.prueba_en_curso = False
+
+    def exito(self):
+        self.fallos = 0
+        self.prueba_en_curso = False
+
+    def fallo(self):
+        self.fallos += 1
+        self.prueba_en_curso = False
+        if self.fallos >= self.fallos_max:
+            self.abierto_hasta = time.monotonic() + self.espera
+
+class ClienteLLM:
+    """Capa asíncrona sobre un backend bloqueante.
+
+    - Como mucho `max_concurrentes` llamadas en curso; el turno se libera
+      cuando el hilo termina, aunque la petición ya haya expirado.
+    - Cada llamada tiene `timeout` segundos (asyncio.TimeoutError si vence).
+    - Los errores de límite de tasa se reintentan con backoff exponencial y
+      jitter completo.
+    - Un circuito corta las llamadas tras fallos seguidos (LLMNoDisponible).
+    """
+
+    def __init__(self, backend, max_concurrentes=LLM_MAX_CONCURRENTES, timeout=LLM_TIMEOUT,
+                 timeout_cola=LLM_TIMEOUT_COLA, reintentos=LLM_REINTENTOS,
+                 backoff_base=LLM_BACKOFF_BASE, backoff_max=LLM_BACKOFF_MAX,
+                 circuito=None):
+        self.backend = backend
+        self.timeout = timeout
+        self.timeout_cola = timeout_cola
+        self.reintentos = reintentos
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.circuito = circuito or CircuitoLLM(LLM_CIRCUITO_FALLOS, LLM_CIRCUITO_ESPERA)
+        self.en_curso = 0
+        self._semaforo = asyncio.Semaphore(max_concurrentes)
+        self._hilos = ThreadPoolExecutor(max_workers=max_concurrentes, thread_name_prefix="llm")
+
+    async def _tomar_turno(self):
+        try:
+            await asyncio.wait_for(self._semaforo.acquire(), timeout=self.timeout_cola)
+        except asyncio.TimeoutError:
+            raise LLMNoDisponible("Demasiadas solicitudes de feedback en curso, intente nuevamente",
+                                  reintentar_en=max(1, int(self.timeout_cola)))
+        self.en_curso += 1
+
+    async def _intento(self, func, *args, hilos=None):
+        """Corre `func` en un hilo con timeout.
+
+        Sin `hilos` toma un turno y lo suelta cuando el hilo termina. Con
+        `hilos` (lista) usa el turno que ya retiene un flujo y agrega el future
+        a la lista, para que el flujo sepa cuándo termina su último hilo.
+        """
+        if hilos is None:
+            await self._tomar_turno()
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._hilos.submit(func, *args)
+        except Exception:
+            if hilos is None:
+                self._liberar()
+            raise
+        if hilos is None:
+            future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._liberar))
+        else:
+            hilos.append(future)
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+
+    def _liberar(self):
+        self.en_curso -= 1
+        self._semaforo.release()
+
+    async def _llamar(self, func, *args, hilos=None):
+        operacion = func.__name__
+        try:
+            prueba = self.circuito.verificar()
+        except LLMNoDisponible:
+            contar("newton_llm_llamadas_total", operacion=operacion, resultado="circuito_abierto")
+            raise
+        try:
+            return await self._reintentar(func, operacion, *args, hilos=hilos)
+        finally:
+            # exito() y fallo() ya la sueltan; esto cubre la prueba que no se
+            # llegó a intentar (sin turno en la cola) o que se canceló
+            if prueba:
+                self.circuito.soltar_prueba()
+
+    async def _reintentar(self, func, operacion, *args, hilos=None):
+        for intento in range(self.reintentos + 1):
+            try:
+                with etapa(f"llm.{operacion}"):
+                    resultado = await self._intento(func, *args, hilos=hilos)
+            except LLMNoDisponible:
+                contar("newton_llm_llamadas_total", operacion=operacion, resultado="no_disponible")
+                raise
+            except Exception as e:
+                if self.backend.es_limite_tasa(e) and intento < self.reintentos:
+                    contar("newton_llm_llamadas_total", operacion=operacion, resultado="reintento")
+                    espera = min(self.backoff_max, self.backoff_base * 2 ** intento)
+                    await asyncio.sleep(random.uniform(0, espera))
+                    continue
+                contar("newton_llm_llamadas_total", operacion=operacion, resultado="error")
+                self.circuito.fallo()
+                raise
+            contar("newton_llm_llamadas_total", operacion=operacion, resultado="ok")
+            self.circuito.exito()
+            return resultado
+
+    async def subir_pdf(self, contenido, nombre):
+        return await self._llamar(self.backend.subir_pdf, contenido, nombre)
+
+    async def generar(self, partes, json_mode=False):
+        return await self._llamar(self.backend.generar, partes, json_mode, self.timeout)
+
+    async def generar_stream(self, partes):
+        """Fragmentos de texto a medida que el modelo los produce.
+
+        El flujo ocupa un turno del límite de concurrencia desde la solicitud
+        inicial (con reintentos y circuito) hasta el último fragmento. Cada
+        fragmento se espera en un hilo con el mismo timeout. Si vence o el
+        consumidor deja de leer, el iterador del backend se cierra y el turno
+        se suelta cuando termina el hilo que seguía esperando.
+        """
+        await self._tomar_turno()
+        hilos = []
+        fragmentos = None
+        try:
+            fragmentos = await self._llamar(self.backend.generar_stream, partes, self.timeout, hilos=hilos)
+            fin = object()
+            while True:
+                try:
+                    fragmento = await self._intento(next, fragmentos, fin, hilos=hilos)
+                except Exception:
+                    self.circuito.fallo()
+                    raise
+                if fragmento is fin:
+                    return
+                yield fragmento
+        finally:
+            self._terminar_flujo(fragmentos, hilos)
+
+    def _terminar_flujo(self, fragmentos, hilos):
+        """Cierra el iterador y suelta el turno del flujo cuando termina su último hilo.
+
+        Los hilos de un flujo corren de a uno, así que como mucho queda uno
+        pendiente (el de un timeout); un generador no se puede cerrar mientras
+        otro hilo lo está recorriendo.
+        """
+        def cerrar_iterador():
+            try:
+                if fragmentos is not None and hasattr(fragmentos, "close"):
+                    fragmentos.close()
+            except Exception:
+                pass  # el flujo ya terminó; solo importa soltar el turno
+
+        pendiente = next((f for f in hilos if not f.done()), None)
+        if pendiente is None:
+            cerrar_iterador()
+            self._liberar()
+            return
+        loop = asyncio.get_running_loop()
+
+        def al_terminar(_):
+            cerrar_iterador()
+            loop.call_soon_threadsafe(self._liberar)
+
+        pendiente.add_done_callback(al_terminar)
+
+# Cliente compartido; se crea en el primer uso.
+_cliente = None
+registro.medidor_funcion("newton_llm_en_curso", lambda: _cliente.en_curso if _cliente is not None else 0)
+
+def obtener_cliente():
+    global _cliente
+    if _cliente is None:
+        backend = BackendLocal() if LLM_BACKEND == "local" else BackendGemini()
+        _cliente = ClienteLLM(backend)
+    return _cliente
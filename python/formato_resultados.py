@@ -0,0 +1,66 @@
+import struct
+import numpy as np
+import orjson
+
+# Formatos de respuesta de la calificación de hojas
+MEDIA_BINARIO = "application/octet-stream"
+FORMATOS = ("json", "binario")
+
+# Registro binario de una hoja (little endian, ancho fijo salvo los textos):
+#   índice u32 | éxito u8 | umbral u8 | preguntas u16 | largo nombre u16 | largo error u16
+#   nombre (utf-8) | error (utf-8) | códigos u8[preguntas] | banderas u8[preguntas]
+#   | relleno u8[preguntas * 5]
+# Códigos: 0 = en blanco, 1..5 = A..E. Banderas: bits BANDERA_* del motor OMR.
+# Relleno de cada burbuja y umbral de marcado de la hoja: 0..255 = 0..100 %.
+CABECERA = struct.Struct("<IBBHHH")
+OPCIONES_POR_PREGUNTA = 5
+
+def elegir_formato(formato, accept):
+    """El parámetro `formato` manda; si no viene, decide el encabezado Accept."""
+    if formato:
+        return formato
+    if accept and MEDIA_BINARIO in accept:
+        return "binario"
+    return "json"
+
+def codificar_registro(indice, archivo, lectura=None, error=None):
+    """Registro binario de una hoja: con `lectura` (LecturaHoja) si se calificó o con `error`."""
+    nombre = archivo.encode("utf-8")[:0xFFFF]
+    mensaje = (error or "").encode("utf-8")[:0xFFFF]
+    if lectura is None:
+        return CABECERA.pack(indice, 0, 0, 0, len(nombre), len(mensaje)) + nombre + mensaje
+    codigos = np.ascontiguousarray(lectura.codigos, np.uint8)
+    umbral = min(255, round(lectura.umbral * 2.55))
+    return b"".join((CABECERA.pack(indice, 1, umbral, len(codigos), len(nombre), len(mensaje)),
+                     nombre, mensaje, codigos.tobytes(),
+                     np.ascontiguousarray(lectura.banderas, np.uint8).tobytes(),
+                     np.ascontiguousarray(lectura.relleno, np.uint8).tobytes()))
+
+def decodificar_registros(datos):
+    """Recorre registros binarios concatenados; para clientes en Python y pruebas."""
+    vista = memoryview(datos)
+    pos = 0
+    while pos < len(vista):
+        indice, exito, umbral, preguntas, largo_nombre, largo_error = CABECERA.unpack_from(vista, pos)
+        pos += CABECERA.size
+        archivo = bytes(vista[pos:pos + largo_nombre]).decode("utf-8")
+        pos += largo_nombre
+        error = bytes(vista[pos:pos + largo_error]).decode("utf-8")
+        pos += largo_error
+        registro = {"indice": indice, "archivo": archivo, "success": bool(exito)}
+        if exito:
+            registro["umbral"] = umbral / 2.55
+            registro["codigos"] = np.frombuffer(vista[pos:pos + preguntas], np.uint8)
+            pos += preguntas
+            registro["banderas"] = np.frombuffer(vista[pos:pos + preguntas], np.uint8)
+            pos += preguntas
+            tam = preguntas * OPCIONES_POR_PREGUNTA
+            registro["relleno"] = np.frombuffer(vista[pos:pos + tam], np.uint8).reshape(preguntas, OPCIONES_POR_PREGUNTA)
+            pos += tam
+        else:
+            registro["error"] = error
+        yield registro
+
+def linea_json(contenido):
+    """Una línea NDJSON serializada con orjson."""
+    return orjson.dumps(contenido, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_SERIALIZE_NUMPY)
@@ -1,12 +1,25 @@
 from fastapi import FastAPI
-from obtener_respuestas_admin import router as router_respuestas_correctas_simulacro
-from orden_cursos_simulacros import router as router_orden_cursos
-from obtener_respuestas_estudiantes import router as router_respuestas_estudiantes
-from analizador_temas_errados import router as router_analizador_temas_errados
+from carga_perezosa import RoutersPerezosos
+from cache_resultados import router as router_cache_resultados
+from metricas import router as router_metricas, medir_peticion
 
 app = FastAPI()
 
-app.include_router(router_respuestas_correctas_simulacro)
-app.include_router(router_orden_cursos)
-app.include_router(router_respuestas_estudiantes)
-app.include_router(router_analizador_temas_errados)
+# Los routers que dependen de OpenCV, pandas, PyMuPDF o Gemini se importan en
+# la primera petición a sus rutas, para no cargarlos en el arranque
+routers = RoutersPerezosos(app, {
+    "obtener_respuestas_admin": ("/obtener-respuestas-admin",),
+    "orden_cursos_simulacros": ("/ordenar-cursos-preguntas",),
+    "obtener_respuestas_estudiantes": ("/obtener-respuestas-estudiantes",
+                                       "/obtener-respuestas-estudiantes-lote",
+                                       "/obtener-respuestas-estudiantes-documento",
+                                       "/imagenes-marcadas"),
+    "analizador_temas_errados": ("/feedback-simulacro", "/feedback-simulacro-stream"),
+    "pipeline_simulacro": ("/procesar-simulacro",),
+})
+app.middleware("http")(routers.cargar_para_peticion)
+app.middleware("http")(medir_peticion)
+app.add_event_handler("startup", routers.iniciar_calentamiento)
+
+app.include_router(router_cache_resultados)
+app.include_router(router_metricas)
@@ -0,0 +1,216 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+from fastapi import APIRouter, Request
+from fastapi.responses import Response
+
+router = APIRouter()
+
+# Buckets de los histogramas (segundos y bytes)
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BUCKETS_BYTES = tuple(256 * 4 ** i for i in range(10))  # 256 B .. 64 MB
+
+# Nombre -> (tipo, ayuda, buckets). Solo se exponen las métricas declaradas.
+METRICAS = {
+    "newton_http_peticiones_total": ("counter", "Peticiones HTTP atendidas por ruta, método y estado", None),
+    "newton_http_duracion_segundos": ("histogram", "Duración de las peticiones HTTP hasta enviar los encabezados", BUCKETS_SEGUNDOS),
+    "newton_http_en_curso": ("gauge", "Peticiones HTTP en curso", None),
+    "newton_http_peticion_bytes": ("histogram", "Tamaño del cuerpo de las peticiones (Content-Length)", BUCKETS_BYTES),
+    "newton_http_respuesta_bytes": ("histogram", "Tamaño de las respuestas con Content-Length", BUCKETS_BYTES),
+    "newton_etapa_duracion_segundos": ("histogram", "Duración de cada etapa del procesamiento", BUCKETS_SEGUNDOS),
+    "newton_hojas_total": ("counter", "Hojas de respuestas calificadas", None),
+    "newton_filas_detectadas_total": ("counter", "Columnas de hoja leídas por detección de filas, por método", None),
+    "newton_registro_total": ("counter", "Intentos de alinear la hoja con la plantilla, por resultado", None),
+    "newton_paginas_pdf_total": ("counter", "Páginas de PDF recorridas, por resultado del descarte previo", None),
+    "newton_filas_excel_total": ("counter", "Filas de Excel leídas", None),
+    "newton_llm_llamadas_total": ("counter", "Llamadas al modelo generativo por operación y resultado", None),
+    "newton_pool_hojas_en_curso": ("gauge", "Tareas en ejecución en el pool de procesos", None),
+    "newton_pool_hojas_en_cola": ("gauge", "Tareas esperando turno en el pool de procesos", None),
+    "newton_llm_en_curso": ("gauge", "Llamadas al modelo generativo en curso", None),
+}
+
+def _etiquetas(etiquetas):
+    return tuple(sorted(etiquetas.items()))
+
+class Registro:
+    """Contadores, medidores e histogramas en memoria, con salida en el
+    formato de texto de Prometheus.
+
+    Los procesos del pool registran en su propia copia; en_proceso() devuelve
+    lo acumulado durante la tarea y el proceso principal lo suma con fusionar().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+        self.funciones = {}
+
+    def reiniciar(self):
+        with self._lock:
+            self.contadores = defaultdict(float)
+            self.medidores = defaultdict(float)
+            self.histogramas = {}
+
+    def contar(self, nombre, valor=1, **etiquetas):
+        with self._lock:
+            self.contadores[(nombre, _etiquetas(etiquetas))] += valor
+
+    def sumar_medidor(self, nombre, valor, **etiquetas):
+        with self._lock:
+            self.medidores[(nombre, _etiquetas(etiquetas))] += valor
+
+    def medidor_funcion(self, nombre, funcion):
+        """Medidor que se lee al exponer las métricas."""
+        self.funciones[nombre] = funcion
+
+    def observar(self, nombre, valor, **etiquetas):
+        buckets = METRICAS[nombre][2]
+        clave = (nombre, _etiquetas(etiquetas))
+        with self._lock:
+            histograma = self.histogramas.get(clave)
+            if histograma is None:
+                histograma = self.histogramas[clave] = [[0] * len(buckets), 0.0, 0]
+            for i, limite in enumerate(buckets):
+                if valor <= limite:
+                    histograma[0][i] += 1
+                    break
+            histograma[1] += valor
+            histograma[2] += 1
+
+    def extraer(self):
+        """Lo acumulado hasta ahora (contadores e histogramas), y vuelve a cero."""
+        with self._lock:
+            datos = (dict(self.contadores), self.histogramas)
+            self.contadores = defaultdict(float)
+            self.histogramas = {}
+        return datos
+
+    def fusionar(self, datos):
+        contadores, histogramas = datos
+        with self._lock:
+            for clave, valor in contadores.items():
+                self.contadores[clave] += valor
+            for clave, (cuentas, suma, total) in histogramas.items():
+                histograma = self.histogramas.get(clave)
+                if histograma is None:
+                    self.histogramas[clave] = [list(cuentas), suma, total]
+                    continue
+                histograma[0] = [a + b for a, b in zip(histograma[0], cuentas)]
+                histograma[1] += suma
+                histograma[2] += total
+
+    def exponer(self):
+        """Texto en el formato de exposición de Prometheus (versión 0.0.4)."""
+        with self._lock:
+            series = defaultdict(list)
+            for (nombre, etiquetas), valor in self.contadores.items():
+                series[nombre].append((nombre, etiquetas, valor))
+            for (nombre, etiquetas), valor in self.medidores.items():
+                series[nombre].append((nombre, etiquetas, valor))
+            for (nombre, etiquetas), (cuentas, suma, total) in self.histogramas.items():
+                acumulado = 0
+                for limite, cuenta in zip(METRICAS[nombre][2], cuentas):
+                    acumulado += cuenta
+                    series[nombre].append((f"{nombre}_bucket", etiquetas + (("le", _numero(limite)),), acumulado))
+                series[nombre].append((f"{nombre}_bucket", etiquetas + (("le", "+Inf"),), total))
+                series[nombre].append((f"{nombre}_sum", etiquetas, suma))
+                series[nombre].append((f"{nombre}_count", etiquetas, total))
+        for nombre, funcion in self.funciones.items():
+            series[nombre].append((nombre, (), funcion()))
+
+        lineas = []
+        for nombre, (tipo, ayuda, _) in METRICAS.items():
+            if nombre not in series:
+                continue
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+            for serie, etiquetas, valor in series[nombre]:
+                texto = ",".join(f'{k}="{_escapar(v)}"' for k, v in etiquetas)
+                lineas.append(f"{serie}{{{texto}}} {_numero(valor)}" if texto else f"{serie} {_numero(valor)}")
+        return "\n".join(lineas) + "\n"
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) and not float(valor).is_integer() else str(int(valor))
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+# Registro del proceso (en los procesos del pool, solo hasta la próxima tarea)
+registro = Registro()
+
+def contar(nombre, valor=1, **etiquetas):
+    registro.contar(nombre, valor, **etiquetas)
+
+class etapa:
+    """Cronometra una etapa en newton_etapa_duracion_segundos; sirve como
+    `with etapa("omr.decodificar"):` o como decorador."""
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        registro.observar("newton_etapa_duracion_segundos", time.perf_counter() - self.inicio, etapa=self.nombre)
+        return False
+
+    def __call__(self, func):
+        @wraps(func)
+        def envuelta(*args, **kwargs):
+            with self:
+                return func(*args, **kwargs)
+        return envuelta
+
+def en_proceso(func, *args):
+    """Corre `func` en un proceso del pool y devuelve (resultado, métricas de la tarea).
+
+    Si `func` falla, las métricas viajan en el atributo `metricas` de la excepción.
+    """
+    registro.reiniciar()
+    try:
+        resultado = func(*args)
+    except Exception as e:
+        e.metricas = registro.extraer()
+        raise
+    return resultado, registro.extraer()
+
+async def esperar_proceso(future):
+    """Espera una tarea enviada con en_proceso, suma sus métricas y devuelve su resultado."""
+    try:
+        resultado, datos = await asyncio.wrap_future(future)
+    except Exception as e:
+        if hasattr(e, "metricas"):
+            registro.fusionar(e.metricas)
+        raise
+    registro.fusionar(datos)
+    return resultado
+
+async def medir_peticion(request: Request, call_next):
+    """Middleware HTTP: duración, estado y tamaños por ruta, y peticiones en curso."""
+    registro.sumar_medidor("newton_http_en_curso", 1)
+    inicio = time.perf_counter()
+    estado = 500
+    try:
+        respuesta = await call_next(request)
+        estado = respuesta.status_code
+        return respuesta
+    finally:
+        registro.sumar_medidor("newton_http_en_curso", -1)
+        # Con la ruta ya resuelta se agrupa por plantilla (/imagenes-marcadas/{id_imagen})
+        plantilla = getattr(request.scope.get("route"), "path", None) or "sin_ruta"
+        etiquetas = {"ruta": plantilla, "metodo": request.method}
+        registro.observar("newton_http_duracion_segundos", time.perf_counter() - inicio, **etiquetas)
+        registro.contar("newton_http_peticiones_total", estado=str(estado), **etiquetas)
+        largo = request.headers.get("content-length")
+        if largo and largo.isdigit():
+            registro.observar("newton_http_peticion_bytes", int(largo), **etiquetas)
+        if estado != 500 and respuesta.headers.get("content-length", "").isdigit():
+            registro.observar("newton_http_respuesta_bytes", int(respuesta.headers["content-length"]), **etiquetas)
+
+@router.get("/metrics")
+async def metrics():
+    return Response(content=registro.exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,10 +1,88 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from fastapi.responses import JSONResponse
 import pandas as pd
+import numpy as np
+import openpyxl
 import io
+import os
+from cache_resultados import cache_respuestas_admin, clave_contenido
+from pool_calificacion import ejecutar_en_proceso
+from metricas import contar, etapa
 
 router = APIRouter()
 
+ENCABEZADO_PREGUNTA = 'pregunta'
+ENCABEZADO_OPCION = 'opción correcta'
+
+@etapa("excel.lectura")
+def leer_hoja_excel(contenido, nombre_archivo):
+    """Lee una sola vez la primera hoja del Excel, sin encabezado.
+
+    Los .xlsx se leen con openpyxl en modo read_only/values_only, que recorre
+    solo las celdas de esa hoja sin construir el modelo completo del libro.
+    """
+    if nombre_archivo.lower().endswith(".xlsx"):
+        libro = openpyxl.load_workbook(io.BytesIO(contenido), read_only=True, data_only=True)
+        try:
+            filas = list(libro.worksheets[0].iter_rows(values_only=True))
+        finally:
+            libro.close()
+        return pd.DataFrame(filas)
+    return pd.read_excel(io.BytesIO(contenido), header=None)
+
+def encontrar_encabezado(texto):
+    """Índice de la primera fila con 'PREGUNTA' y 'OPCIÓN CORRECTA', o None."""
+    con_pregunta = (texto == ENCABEZADO_PREGUNTA).any(axis=1).to_numpy()
+    con_opcion = (texto == ENCABEZADO_OPCION).any(axis=1).to_numpy()
+    filas = np.flatnonzero(con_pregunta & con_opcion)
+    return int(filas[0]) if len(filas) else None
+
+def cargar_respuestas_correctas(contenido, nombre_archivo):
+    """Devuelve la clave de respuestas como lista de {numeropregunta, opcioncorrecta}.
+
+    Lanza ValueError si el archivo no tiene el encabezado o bloques esperados.
+    """
+    df_raw = leer_hoja_excel(contenido, nombre_archivo)
+    contar("newton_filas_excel_total", len(df_raw))
+    texto = df_raw.astype(str).apply(lambda col: col.str.strip().str.lower())
+
+    encabezado_fila = encontrar_encabezado(texto)
+    if encabezado_fila is None:
+        raise ValueError("No se encontró fila con encabezado 'PREGUNTA' y 'OPCIÓN CORRECTA'")
+
+    # Cada bloque es una columna PREGUNTA seguida de su OPCIÓN CORRECTA
+    encabezado = texto.iloc[encabezado_fila].tolist()
+    datos = df_raw.iloc[encabezado_fila + 1:]
+    tablas = []
+    for j in range(len(encabezado) - 1):
+        if ENCABEZADO_PREGUNTA in encabezado[j] and ENCABEZADO_OPCION in encabezado[j + 1]:
+            df_tabla = datos.iloc[:, [j, j + 1]].copy()
+            df_tabla.columns = ['numeropregunta', 'opcioncorrecta']
+            tablas.append(df_tabla)
+
+    if not tablas:
+        raise ValueError("No se encontraron tablas válidas.")
+
+    df_final = pd.concat(tablas, ignore_index=True)
+    df_final.dropna(subset=['numeropregunta', 'opcioncorrecta'], inplace=True)
+    df_final['numeropregunta'] = pd.to_numeric(df_final['numeropregunta'], errors='coerce')
+    df_final.dropna(subset=['numeropregunta'], inplace=True)
+    df_final['numeropregunta'] = df_final['numeropregunta'].astype(int)
+    df_final.sort_values('numeropregunta', inplace=True)
+
+    return df_final.to_dict(orient='records')
+
+async def obtener_respuestas_correctas(contenido, nombre_archivo):
+    """cargar_respuestas_correctas con caché por contenido, fuera del event loop."""
+    # La extensión decide el lector, así que forma parte de la clave
+    extension = os.path.splitext(nombre_archivo)[1].lower()
+    clave = clave_contenido(extension, contenido)
+    json_result = cache_respuestas_admin.obtener(clave)
+    if json_result is None:
+        json_result = await ejecutar_en_proceso(cargar_respuestas_correctas, contenido, nombre_archivo)
+        cache_respuestas_admin.guardar(clave, json_result)
+    return json_result
+
 @router.post("/obtener-respuestas-admin")
 async def obtener_respuestas_admin(file: UploadFile = File(...)):
     if not file.filename.endswith((".xlsx", ".xls")):
@@ -12,54 +90,12 @@ async def obtener_respuestas_admin(file: UploadFile = File(...)):
 
     try:
         contenido = await file.read()
-        df_raw = pd.read_excel(io.BytesIO(contenido), header=None)
-
-        encabezado_fila = None
-        for i, row in df_raw.iterrows():
-            row_str = row.astype(str).str.strip().str.lower()
-            if 'pregunta' in row_str.values and 'opción correcta' in row_str.values:
-                encabezado_fila = i
-                break
-
-        if encabezado_fila is None:
-            return JSONResponse(status_code=400, content={"error": "No se encontró fila con encabezado 'PREGUNTA' y 'OPCIÓN CORRECTA'"})
-
-        columnas_indices = [4, 5, 7, 8, 10, 11, 13, 14]
-        tablas = []
-        for i in range(0, len(columnas_indices), 2):
-            cols = columnas_indices[i:i+2]
-
-            df_tabla = pd.read_excel(
-                io.BytesIO(contenido),
-                header=encabezado_fila,
-                usecols=cols
-            )
-
-            df_tabla.columns = [str(c).strip() for c in df_tabla.columns]
-
-            pregunta_col = next((c for c in df_tabla.columns if 'pregunta' in c.lower()), None)
-            opcion_col = next((c for c in df_tabla.columns if 'opción correcta' in c.lower()), None)
-
-            if pregunta_col is None or opcion_col is None:
-                continue
-
-            df_tabla = df_tabla[[pregunta_col, opcion_col]].copy()
-            df_tabla.rename(columns={pregunta_col: 'numeropregunta', opcion_col: 'opcioncorrecta'}, inplace=True)
-
-            tablas.append(df_tabla)
-
-        if not tablas:
-            return JSONResponse(status_code=400, content={"error": "No se encontraron tablas válidas."})
-
-        df_final = pd.concat(tablas, ignore_index=True)
-        df_final.dropna(subset=['numeropregunta', 'opcioncorrecta'], inplace=True)
-        df_final['numeropregunta'] = pd.to_numeric(df_final['numeropregunta'], errors='coerce')
-        df_final.dropna(subset=['numeropregunta'], inplace=True)
-        df_final['numeropregunta'] = df_final['numeropregunta'].astype(int)
-        df_final.sort_values('numeropregunta', inplace=True)
+        try:
+            json_result = await obtener_respuestas_correctas(contenido, file.filename)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
 
-        json_result = df_final.to_dict(orient='records')
         return {"success": True, "data": json_result}
 
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": f"Error procesando archivo: {str(e)}"})
\ No newline at end of file
+        return JSONResponse(status_code=500, content={"error": f"Error procesando archivo: {str(e)}"})
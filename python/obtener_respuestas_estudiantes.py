@@ -1,11 +1,22 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, Header, HTTPException, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse, Response
+from cachetools import TTLCache
+from pool_calificacion import admitir_lote, ejecutar_en_pool, cerrar_executor, OMR_MAX_EN_CURSO
+from registro_plantillas import PLANTILLAS, PLANTILLA_POR_DEFECTO, obtener_layout, registrar_hoja, tamano_plantilla
+from formato_resultados import MEDIA_BINARIO, codificar_registro, elegir_formato, linea_json
+from metricas import contar, etapa
+from PIL import Image
+import asyncio
 import cv2
+import fitz  # PyMuPDF
 import numpy as np
-import json
 import io
-from tempfile import NamedTemporaryFile
-from typing import List, Dict
+import os
+import tempfile
+import uuid
+import zipfile
+from functools import partial
+from typing import List, Dict, Literal, NamedTuple, Optional
 
 router = APIRouter()
 
@@ -21,9 +32,32 @@ def detect_columns(img):
         bounds.append((x0, pad_y, x1 - x0, h - 2*pad_y))
     return bounds
 
+def find_peaks(smoothed, threshold):
+    """Índices de los máximos locales estrictos de `smoothed` por encima de `threshold`."""
+    centro = smoothed[1:-1]
+    mask = (centro > threshold) & (centro > smoothed[:-2]) & (centro > smoothed[2:])
+    return np.flatnonzero(mask) + 1
+
+def cluster_peaks(peaks, cluster_thresh):
+    """Agrupa picos cercanos y devuelve el centro entero de cada grupo.
+
+    Cada grupo reúne los picos a menos de `cluster_thresh` de su primer pico. Los
+    inicios de grupo se ubican con searchsorted (un paso por grupo, no por pico)
+    y las medias salen de np.add.reduceat.
+    """
+    n = len(peaks)
+    starts = []
+    i = 0
+    while i < n:
+        starts.append(i)
+        i = max(i + 1, int(np.searchsorted(peaks, peaks[i] + cluster_thresh, side='left')))
+    starts = np.asarray(starts)
+    counts = np.diff(np.append(starts, n))
+    return (np.add.reduceat(peaks, starts) / counts).astype(np.int64)
+
 def detect_rows(col_img):
     """Divide cada columna en filas usando proyección vertical con ajustes dinámicos."""
-    gray = cv2.cvtColor(col_img, cv2.COLOR_BGR2GRAY)
+    gray = col_img if col_img.ndim == 2 else cv2.cvtColor(col_img, cv2.COLOR_BGR2GRAY)
     blurred = cv2.GaussianBlur(gray, (5, 5), 0)
     thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
     
@@ -34,279 +68,743 @@ def detect_rows(col_img):
     kernel = np.ones(kernel_size) / kernel_size
     smoothed = np.convolve(projection, kernel, mode='same')
     
-    peaks = []
-    threshold = np.mean(smoothed) * 0.8
-    for i in range(1, len(smoothed)-1):
-        if smoothed[i] > threshold and smoothed[i] > smoothed[i-1] and smoothed[i] > smoothed[i+1]:
-            peaks.append(i)
-    
+    peaks = find_peaks(smoothed, np.mean(smoothed) * 0.8)
     if len(peaks) < 20:
         return detect_rows_fallback(col_img)
     
-    clustered = []
-    cluster_thresh = h // 50
-    current_cluster = []
-    for peak in sorted(peaks):
-        if not current_cluster:
-            current_cluster.append(peak)
-        else:
-            if peak - current_cluster[0] < cluster_thresh:
-                current_cluster.append(peak)
-            else:
-                clustered.append(int(np.mean(current_cluster)))
-                current_cluster = [peak]
-    if current_cluster:
-        clustered.append(int(np.mean(current_cluster)))
-    
-    clustered = sorted(clustered)
+    clustered = cluster_peaks(peaks, h // 50)
     
-    start_index = 0
-    for i, peak in enumerate(clustered):
-        if peak > h * 0.1:
-            start_index = i
-            break
+    # Primera fila: primer centro por debajo del 10% superior de la columna
+    debajo = clustered > h * 0.1
+    start_index = int(np.argmax(debajo)) if debajo.any() else 0
     
     if len(clustered) - start_index < 25:
         return detect_rows_fallback(col_img)
     
-    clustered = clustered[start_index:start_index+25]
+    contar("newton_filas_detectadas_total", metodo="proyeccion")
+    centers = clustered[start_index:start_index+25]
     
-    rows = []
-    for i in range(25):
-        center = clustered[i]
-        y0 = center - h//70
-        y1 = center + h//70
-        
-        if i == 0:
-            y0 = max(0, center - h//60)
-        elif i == 24:
-            y1 = min(h, center + h//60)
-        
-        if i > 0 and y0 < rows[i-1][1]:
-            y0 = rows[i-1][1] + 1
-            
-        rows.append((int(y0), int(y1)))
+    y0 = centers - h//70
+    y1 = centers + h//70
+    y0[0] = max(0, centers[0] - h//60)
+    y1[24] = min(h, centers[24] + h//60)
     
-    return rows
+    # Evitar que una fila empiece antes de que termine la anterior
+    y0[1:] = np.where(y0[1:] < y1[:-1], y1[:-1] + 1, y0[1:])
+    
+    return list(zip(y0.tolist(), y1.tolist()))
 
 def detect_rows_fallback(col_img):
+    contar("newton_filas_detectadas_total", metodo="respaldo")
     h = col_img.shape[0]
     
-    gray = cv2.cvtColor(col_img, cv2.COLOR_BGR2GRAY)
+    gray = col_img if col_img.ndim == 2 else cv2.cvtColor(col_img, cv2.COLOR_BGR2GRAY)
     _, thresh = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY_INV)
     projection = np.sum(thresh, axis=1) / 255
     
-    start_index = 0
-    threshold = np.max(projection) * 0.1
-    for i in range(len(projection)):
-        if projection[i] > threshold:
-            start_index = i
-            break
-    
-    height_available = h - start_index
-    row_h = height_available / 25.0
+    # Primera fila con tinta (argmax devuelve 0 si no hay ninguna)
+    start_index = int(np.argmax(projection > np.max(projection) * 0.1))
     
-    rows = []
-    for i in range(25):
-        y0 = int(start_index + i * row_h)
-        y1 = int(start_index + (i+1) * row_h)
-        rows.append((y0, y1))
-    return rows
-
-def get_bubble_darkness(bubble_roi):
-    """Calcula el nivel de oscuridad de una burbuja."""
-    if bubble_roi.size == 0:
-        return 255  # Valor alto para burbujas vacías
-    gray = cv2.cvtColor(bubble_roi, cv2.COLOR_BGR2GRAY)
-    return np.mean(gray)
-
-def mark(img, col_bounds, output_img):
-    marked = img.copy()
-    respuestas = {str(i): None for i in range(1, 101)}
-
-    for ci, (xs, ys, w, h) in enumerate(col_bounds):
+    row_h = (h - start_index) / 25.0
+    edges = (start_index + np.arange(26) * row_h).astype(np.int64)
+    return list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+
+# Geometría de las burbujas por tipo de columna: las tres primeras reservan 15%
+# del ancho para el número de pregunta, la cuarta reserva 25% y se recorta al
+# borde de la columna.
+OPCIONES = "ABCDE"
+UMBRAL_MARCADO = 43.0
+
+# Banderas por pregunta (bits) y ventaja mínima, en puntos de relleno, de la
+# opción elegida sobre la segunda para no mandarla a revisión; si la opción
+# más rellena no llega al umbral, esa misma ventaja indica una marca débil
+BANDERA_EN_BLANCO = 1
+BANDERA_MULTIPLE = 2
+BANDERA_MARGEN_BAJO = 4
+BANDERA_MARCA_DEBIL = 8
+NOMBRES_BANDERAS = ((BANDERA_EN_BLANCO, "en_blanco"), (BANDERA_MULTIPLE, "multiple"),
+                    (BANDERA_MARGEN_BAJO, "margen_bajo"), (BANDERA_MARCA_DEBIL, "marca_debil"))
+OMR_MARGEN_MINIMO = float(os.environ.get("OMR_MARGEN_MINIMO", 15.0))
+
+# Umbral de marcado: "adaptativo" lo calcula por hoja (Otsu sobre los 500
+# rellenos) y vuelve a UMBRAL_MARCADO si marcadas y vacías no se separan al
+# menos OMR_SEPARACION_MINIMA puntos; "fijo" usa siempre UMBRAL_MARCADO.
+# En modo adaptativo una pregunta también está marcada si su opción más
+# rellena supera en OMR_CONTRASTE_FILA puntos a la mediana de las otras
+# cuatro (marcas corridas por la inclinación que no llegan al umbral).
+OMR_UMBRAL = os.environ.get("OMR_UMBRAL", "adaptativo")
+OMR_CONTRASTE_FILA = float(os.environ.get("OMR_CONTRASTE_FILA", 18.0))
+OMR_SEPARACION_MINIMA = float(os.environ.get("OMR_SEPARACION_MINIMA", 20.0))
+# Desvíos robustos (MAD) sobre la mediana de las burbujas vacías que se
+# aceptan como fondo antes de considerar marcada una burbuja
+OMR_DESVIOS_FONDO = float(os.environ.get("OMR_DESVIOS_FONDO", 6.0))
+
+# Alinear cada hoja a la plantilla registrada antes de usar la detección por filas
+OMR_REGISTRO = os.environ.get("OMR_REGISTRO", "1") != "0"
+
+def bubble_coords(col_bounds, col_rows):
+    """Calcula las coordenadas (x0, y0, x1, y1) de las 500 burbujas.
+
+    Devuelve un arreglo de forma (100, 5, 4) a partir de los límites de cada
+    columna y de las 25 filas detectadas en cada una.
+    """
+    coords = np.zeros((len(col_bounds) * 25, 5, 4), dtype=np.int64)
+    oi = np.arange(5)
+
+    for ci, ((xs, ys, w, h), rows) in enumerate(zip(col_bounds, col_rows)):
         xe, ye = xs + w, ys + h
-        cv2.rectangle(marked, (xs, ys), (xe, ye), (255,0,0), 2)
-        cv2.putText(marked, f"C{ci+1}", (xs+5, ys+25),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255,0,0), 2)
-        sub = marked[ys:ye, xs:xe]
-        rows = detect_rows(sub)
-
+        rows = np.asarray(rows, dtype=np.int64)
+        gy0 = ys + rows[:, 0]
+        gy1 = ys + rows[:, 1]
+        gy1 = np.where(gy1 - gy0 < 5, gy0 + 10, gy1)
+
+        reserve_percent = 0.15 if ci < 3 else 0.25
+        start_x = xs + int(w * reserve_percent)
+        opt_w = (w - int(w * reserve_percent)) // 5
+
+        margin = max(8, int(opt_w * 0.15))
+        margin_left = np.full(5, margin)
+        margin_right = np.full(5, margin)
+        if ci < 3:
+            margin_left[0] = max(25, int(opt_w * 0.35))
+            margin_right[4] = max(25, int(opt_w * 0.35))
+
+        margin_v = np.maximum(5, ((gy1 - gy0) * 0.15).astype(np.int64))
+
+        ox0 = np.broadcast_to(start_x + oi * opt_w + margin_left, (25, 5))
+        ox1 = np.broadcast_to(start_x + (oi + 1) * opt_w - margin_right, (25, 5))
+        oy0 = np.broadcast_to((gy0 + margin_v)[:, None], (25, 5))
+        oy1 = np.broadcast_to((gy1 - margin_v)[:, None], (25, 5))
+
+        if ci >= 3:
+            ox1 = np.minimum(ox1, xe)
+            oy1 = np.minimum(oy1, ye)
+            ox0 = np.maximum(ox0, xs)
+            oy0 = np.maximum(oy0, ys)
+
+        ox1 = np.where(ox1 <= ox0, ox0 + 10, ox1)
+        oy1 = np.where(oy1 <= oy0, oy0 + 10, oy1)
+
+        coords[ci * 25:(ci + 1) * 25] = np.stack([ox0, oy0, ox1, oy1], axis=-1)
+
+    return coords
+
+def bubble_fill(gray, coords):
+    """Porcentaje de relleno de cada burbuja, de forma (preguntas, 5).
+
+    Usa la imagen integral de la hoja en gris: la oscuridad media de cada
+    burbuja sale de cuatro lecturas, sin recortar ROIs una por una.
+    Las burbujas vacías (fuera de la imagen) cuentan como 0%.
+    """
+    h, w = gray.shape[:2]
+    integral = cv2.integral(gray, sdepth=cv2.CV_64F)
+
+    x0 = np.clip(coords[..., 0], 0, w)
+    y0 = np.clip(coords[..., 1], 0, h)
+    x1 = np.clip(coords[..., 2], x0, w)
+    y1 = np.clip(coords[..., 3], y0, h)
+
+    suma = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+    area = (x1 - x0) * (y1 - y0)
+    darkness = np.divide(suma, area, out=np.full(suma.shape, 255.0), where=area > 0)
+    return (255 - darkness) / 255 * 100
+
+def select_answers(fill, threshold=UMBRAL_MARCADO, min_contrast=None):
+    """Índice de la opción marcada por pregunta, o -1 si ninguna supera el umbral.
+
+    Con `min_contrast` también se acepta la opción más rellena que supera a
+    la mediana de las otras cuatro por al menos esa cantidad de puntos.
+    """
+    darkest_idx = np.argmax(fill, axis=1)
+    darkest_value = fill[np.arange(len(fill)), darkest_idx]
+    marked = darkest_value >= threshold
+    if min_contrast is not None:
+        marked |= row_contrast(fill) >= min_contrast
+    return np.where(marked, darkest_idx, -1)
+
+def row_contrast(fill):
+    """Relleno de la opción más rellena menos la mediana de las otras cuatro (fondo de la fila)."""
+    ordered = np.sort(fill, axis=1)
+    return ordered[:, -1] - np.median(ordered[:, :-1], axis=1)
+
+def otsu_threshold(values, min_separation=OMR_SEPARACION_MINIMA):
+    """Umbral de Otsu de un vector de rellenos, o None si no hay dos clases.
+
+    Prueba todos los cortes del vector ordenado con sumas acumuladas y se queda
+    con el de mayor varianza entre clases; el umbral cae a mitad del hueco.
+    """
+    v = np.sort(np.asarray(values, np.float64).ravel())
+    n = len(v)
+    if n < 2:
+        return None
+    low_count = np.arange(1, n)
+    low_sum = np.cumsum(v)[:-1]
+    low_mean = low_sum / low_count
+    high_mean = (v.sum() - low_sum) / (n - low_count)
+    between = low_count * (n - low_count) * (high_mean - low_mean) ** 2
+    between[v[1:] == v[:-1]] = -1  # solo cortes entre valores distintos
+    k = int(np.argmax(between))
+    if between[k] < 0 or high_mean[k] - low_mean[k] < min_separation:
+        return None
+    return float((v[k] + v[k + 1]) / 2)
+
+def sheet_threshold(fill, modo=None):
+    """Umbral de marcado de la hoja según OMR_UMBRAL (o `modo`).
+
+    En modo adaptativo parte del corte de Otsu y lo limita al borde superior
+    de las burbujas vacías (mediana + OMR_DESVIOS_FONDO desvíos robustos):
+    con marcas de intensidad variada Otsu se corre hacia las más oscuras y
+    dejaría fuera las de lápiz claro.
+    """
+    if (modo or OMR_UMBRAL) != "adaptativo":
+        return UMBRAL_MARCADO
+    threshold = otsu_threshold(fill)
+    if threshold is None:
+        return UMBRAL_MARCADO
+    empty = fill[fill < threshold]
+    median = np.median(empty)
+    mad = 1.4826 * np.median(np.abs(empty - median))
+    return float(min(threshold, median + OMR_DESVIOS_FONDO * max(mad, 1.0)))
+
+def decide_answers(fill, modo=None):
+    """(umbral, selección) de la hoja según OMR_UMBRAL (o `modo`)."""
+    threshold = sheet_threshold(fill, modo)
+    min_contrast = OMR_CONTRASTE_FILA if (modo or OMR_UMBRAL) == "adaptativo" else None
+    return threshold, select_answers(fill, threshold, min_contrast)
+
+def answer_flags(fill, seleccion, threshold=UMBRAL_MARCADO, min_margin=OMR_MARGEN_MINIMO):
+    """Banderas de cada pregunta: en blanco, varias opciones sobre el umbral
+    (doble marca o borrón), opción elegida con poca ventaja sobre la segunda
+    y una opción que se destaca de la segunda sin llegar al umbral (marca
+    clara o desalineada, leída por contraste de fila o dejada en blanco)."""
+    top2 = np.sort(fill, axis=1)[:, -2:]
+    margin = top2[:, 1] - top2[:, 0]
+    flags = np.where(seleccion < 0, BANDERA_EN_BLANCO, 0)
+    flags |= np.where((fill >= threshold).sum(axis=1) >= 2, BANDERA_MULTIPLE, 0)
+    flags |= np.where((seleccion >= 0) & (margin < min_margin), BANDERA_MARGEN_BAJO, 0)
+    flags |= np.where((top2[:, 1] < threshold) & (margin >= min_margin), BANDERA_MARCA_DEBIL, 0)
+    return flags.astype(np.uint8)
+
+# Gris equivalente al azul (255, 0, 0) con que se dibuja el marco de columna
+GRIS_MARCO = 29
+
+def map_point(x, y, mapear=None):
+    """Lleva un punto de la resolución de trabajo al lienzo del overlay."""
+    if mapear is None:
+        return (int(x), int(y))
+    px, py = mapear(np.float32([[x, y]]))[0]
+    return (int(round(px)), int(round(py)))
+
+def draw_box(marked, x0, y0, x1, y1, color, thickness, mapear=None):
+    """Dibuja un rectángulo; si hay `mapear` se dibuja el cuadrilátero transformado."""
+    if mapear is None:
+        cv2.rectangle(marked, (x0, y0), (x1, y1), color, thickness)
+        return
+    esquinas = mapear(np.float32([[x0, y0], [x1, y0], [x1, y1], [x0, y1]]))
+    cv2.polylines(marked, [np.round(esquinas).astype(np.int32)], True, color, thickness)
+
+def frame_column(img, ci, bounds, color, mapear=None):
+    """Dibuja el marco y la etiqueta de la columna `ci` con límites (x, y, w, h)."""
+    xs, ys, w, h = bounds
+    draw_box(img, xs, ys, xs + w, ys + h, color, 2, mapear)
+    cv2.putText(img, f"C{ci+1}", map_point(xs+5, ys+25, mapear),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+
+def analyze_rows(gray, col_bounds):
+    """Detección por filas de cada columna. Devuelve (col_rows, coords, fill)."""
+    # La detección de filas se calibró con el marco y la etiqueta de la columna
+    # ya dibujados, así que se dibujan sobre el recorte gris de cada columna.
+    col_rows = []
+    for ci, (xs, ys, w, h) in enumerate(col_bounds):
+        col_gray = gray[ys:ys+h, xs:xs+w].copy()
+        frame_column(col_gray, ci, (0, 0, w, h), GRIS_MARCO)
+        col_rows.append(detect_rows(col_gray))
+
+    coords = bubble_coords(col_bounds, col_rows)
+    return col_rows, coords, bubble_fill(gray, coords)
+
+def draw_row_overlay(marked, col_bounds, col_rows, coords, seleccion, mapear=None):
+    """Overlay completo de la detección por filas: columnas, filas y burbujas."""
+    for ci, bounds in enumerate(col_bounds):
+        frame_column(marked, ci, bounds, (255,0,0), mapear)
+    draw_rows(marked, col_bounds, col_rows, mapear)
+    draw_bubbles(marked, coords, seleccion, mapear)
+
+def draw_rows(marked, col_bounds, col_rows, mapear=None):
+    """Dibuja las filas detectadas y el número de pregunta de cada una."""
+    for ci, ((xs, ys, w, h), rows) in enumerate(zip(col_bounds, col_rows)):
+        xe = xs + w
         for ri, (r0, r1) in enumerate(rows):
             gy0, gy1 = ys+r0, ys+r1
             if gy1 - gy0 < 5:
                 gy1 = gy0 + 10
 
-            cv2.rectangle(marked, (xs, gy0), (xe, gy1), (0,0,255), 1)
+            draw_box(marked, xs, gy0, xe, gy1, (0,0,255), 1, mapear)
             q = ci*25 + ri + 1
 
             q_x = xs + 5
             q_y = gy0 + int((gy1 - gy0) * 0.6)
-            cv2.putText(marked, str(q), (q_x, q_y),
+            cv2.putText(marked, str(q), map_point(q_x, q_y, mapear),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0,0,255), 2)
 
-            if ci < 3:
-                reserve_percent = 0.15
-                start_x = xs + int(w * reserve_percent)
-                opt_total_width = w - int(w * reserve_percent)
-                opt_w = opt_total_width // 5
-
-                margin_v = max(5, int((gy1 - gy0) * 0.15))
-                bubbles = []
-
-                for oi in range(5):
-                    if oi == 0:
-                        margin_left = max(25, int(opt_w * 0.35))
-                        margin_right = max(8, int(opt_w * 0.15))
-                    elif oi == 4:
-                        margin_left = max(8, int(opt_w * 0.15))
-                        margin_right = max(25, int(opt_w * 0.35))
-                    else:
-                        margin_left = max(8, int(opt_w * 0.15))
-                        margin_right = margin_left
-
-                    ox0 = start_x + oi * opt_w + margin_left
-                    ox1 = start_x + (oi+1)*opt_w - margin_right
-                    oy0 = gy0 + margin_v
-                    oy1 = gy1 - margin_v
-
-                    if ox1 <= ox0:
-                        ox1 = ox0 + 10
-                    if oy1 <= oy0:
-                        oy1 = oy0 + 10
-
-                    cv2.rectangle(marked, (ox0, oy0), (ox1, oy1), (0, 255, 0), 2)
-
-                    letter = chr(65 + oi)
-                    letter_x = ox0 + int((ox1 - ox0) * 0.5) - 5
-                    letter_y = oy0 + int((oy1 - oy0) * 0.6)
-                    cv2.putText(marked, letter, (letter_x, letter_y),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 128, 0), 2)
-
-                    bubble_roi = img[oy0:oy1, ox0:ox1]
-                    darkness = get_bubble_darkness(bubble_roi)
-                    percent = (255 - darkness) / 255 * 100
-                    bubbles.append({
-                        'coords': (ox0, oy0, ox1, oy1),
-                        'darkness': darkness,
-                        'percent': percent,
-                        'letter': letter
-                    })
-
-                if bubbles:
-                    darkest_idx = np.argmax([b['percent'] for b in bubbles])
-                    darkest_value = bubbles[darkest_idx]['percent']
-                    if darkest_value >= 43.0:
-                        ox0, oy0, ox1, oy1 = bubbles[darkest_idx]['coords']
-                        cv2.rectangle(marked, (ox0, oy0), (ox1, oy1), (255, 0, 0), 4)
-
-                        respuestas[str(q)] = bubbles[darkest_idx]['letter']
-
-            else:
-                reserve_percent = 0.25
-                start_x = xs + int(w * reserve_percent)
-                opt_total_width = w - int(w * reserve_percent)
-                opt_w = opt_total_width // 5
-
-                row_height = gy1 - gy0
-                margin_v = max(5, int(row_height * 0.15))
-                bubbles = []
-
-                for oi in range(5):
-                    margin_left = max(8, int(opt_w * 0.15))
-                    margin_right = margin_left
-
-                    ox0 = start_x + oi * opt_w + margin_left
-                    ox1 = start_x + (oi+1) * opt_w - margin_right
-                    oy0 = gy0 + margin_v
-                    oy1 = gy1 - margin_v
-
-                    if ox1 > xe:
-                        ox1 = xe
-                    if oy1 > ye:
-                        oy1 = ye
-                    if ox0 < xs:
-                        ox0 = xs
-                    if oy0 < ys:
-                        oy0 = ys
-
-                    if ox1 <= ox0:
-                        ox1 = ox0 + 10
-                    if oy1 <= oy0:
-                        oy1 = oy0 + 10
-
-                    cv2.rectangle(marked, (ox0, oy0), (ox1, oy1), (0, 255, 0), 2)
-
-                    letter = chr(65 + oi)
-                    letter_x = ox0 + int((ox1 - ox0) * 0.5) - 5
-                    letter_y = oy0 + int((oy1 - oy0) * 0.6)
-                    cv2.putText(marked, letter, (letter_x, letter_y),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 128, 0), 2)
-
-                    bubble_roi = img[oy0:oy1, ox0:ox1]
-                    darkness = get_bubble_darkness(bubble_roi)
-                    percent = (255 - darkness) / 255 * 100
-                    bubbles.append({
-                        'coords': (ox0, oy0, ox1, oy1),
-                        'darkness': darkness,
-                        'percent': percent,
-                        'letter': letter
-                    })
-
-                if bubbles:
-                    darkest_idx = np.argmax([b['percent'] for b in bubbles])
-                    darkest_value = bubbles[darkest_idx]['percent']
-                    if darkest_value >= 43.0:
-                        ox0, oy0, ox1, oy1 = bubbles[darkest_idx]['coords']
-                        cv2.rectangle(marked, (ox0, oy0), (ox1, oy1), (255, 0, 0), 4)
-
-                        respuestas[str(q)] = bubbles[darkest_idx]['letter']
-
-    cv2.imwrite(output_img, marked)
-
-    output_list = []
-    for i in range(1, 101):
-        output_list.append({
-            "numeropregunta": i,
-            "opcionseleccionada": respuestas.get(str(i))
-        })
-
-    return output_list
-
+def draw_bubbles(marked, coords, seleccion, mapear=None):
+    """Dibuja las burbujas muestreadas y resalta la opción detectada."""
+    for q in range(len(coords)):
+        for oi, (ox0, oy0, ox1, oy1) in enumerate(coords[q].tolist()):
+            draw_box(marked, ox0, oy0, ox1, oy1, (0, 255, 0), 2, mapear)
+            letter_x = ox0 + int((ox1 - ox0) * 0.5) - 5
+            letter_y = oy0 + int((oy1 - oy0) * 0.6)
+            cv2.putText(marked, OPCIONES[oi], map_point(letter_x, letter_y, mapear),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 128, 0), 2)
+
+        if seleccion[q] >= 0:
+            ox0, oy0, ox1, oy1 = coords[q, seleccion[q]].tolist()
+            draw_box(marked, ox0, oy0, ox1, oy1, (255, 0, 0), 4, mapear)
+
+def format_answers(seleccion):
+    return [
+        {
+            "numeropregunta": q + 1,
+            "opcionseleccionada": OPCIONES[idx] if idx >= 0 else None
+        }
+        for q, idx in enumerate(seleccion.tolist())
+    ]
+
+class LecturaHoja(NamedTuple):
+    """Lectura compacta de una hoja.
+
+    `codigos`: uint8 por pregunta, 0 = en blanco y 1..5 = A..E (la misma
+    codificación que usa puntuacion_cohorte). `relleno`: uint8 (preguntas, 5)
+    con el relleno de cada burbuja, 0..255 = 0..100 %. `banderas`: uint8 por
+    pregunta con los bits BANDERA_*. `umbral`: relleno (%) desde el que se
+    consideró marcada una burbuja en esta hoja.
+    """
+    codigos: np.ndarray
+    relleno: np.ndarray
+    banderas: np.ndarray
+    umbral: float
+
+# Banderas que mandan la hoja a revisión manual (en blanco sin marca débil no es ambiguo)
+BANDERAS_REVISION = BANDERA_MULTIPLE | BANDERA_MARGEN_BAJO | BANDERA_MARCA_DEBIL
+
+def lectura_compacta(fill, threshold, seleccion):
+    relleno = np.round(np.clip(fill, 0, 100) * 2.55).astype(np.uint8)
+    return LecturaHoja((seleccion + 1).astype(np.uint8), relleno,
+                       answer_flags(fill, seleccion, threshold), float(threshold))
+
+def respuestas_de_lectura(lectura):
+    return format_answers(lectura.codigos.astype(np.int16) - 1)
+
+def detalle_de_lectura(lectura):
+    """Respuestas con el relleno de las 5 opciones (%), la ventaja de la
+    primera sobre la segunda y las banderas de cada pregunta."""
+    relleno = lectura.relleno / 2.55
+    top2 = np.sort(relleno, axis=1)[:, -2:]
+    margen = top2[:, 1] - top2[:, 0]
+    detalle = respuestas_de_lectura(lectura)
+    for item, fila, m, b in zip(detalle, np.round(relleno, 1).tolist(), np.round(margen, 1).tolist(),
+                                lectura.banderas.tolist()):
+        item["relleno"] = fila
+        item["margen"] = m
+        item["banderas"] = [nombre for bit, nombre in NOMBRES_BANDERAS if b & bit]
+    return detalle
+
+def revision_de_lectura(lectura):
+    """Si la hoja necesita revisión manual y qué preguntas la motivan."""
+    dudosas = np.flatnonzero(lectura.banderas & BANDERAS_REVISION) + 1
+    return {"requiere_revision": bool(len(dudosas)), "preguntas_dudosas": dudosas.tolist()}
+
+def leer_imagen(gray, debug_image=False, original=None):
+    """Lee una hoja en gris a resolución de trabajo.
+
+    Primero la alinea contra la plantilla registrada y, si no se puede, usa la
+    detección de filas por columna. Las marcas se deciden con decide_answers.
+    Devuelve (relleno, umbral, seleccion, imagen_marcada).
+
+    Con `debug_image` el overlay se dibuja sobre `original` (la hoja en color a
+    resolución completa) y solo entonces se llevan las coordenadas de trabajo
+    a ese lienzo; sin `original` se dibuja sobre la propia imagen de trabajo.
+    """
+    if debug_image:
+        lienzo = original.copy() if original is not None else cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        escala = np.float32([lienzo.shape[1] / gray.shape[1], lienzo.shape[0] / gray.shape[0]])
+
+    layout = obtener_layout(tamano=tamano_trabajo()) if OMR_REGISTRO else None
+    registro = None
+    if layout is not None:
+        with etapa("omr.registro"):
+            registro = registrar_hoja(gray, layout)
+        contar("newton_registro_total", resultado="alineada" if registro is not None else "fallida")
+    if registro is not None:
+        aligned, homografia = registro
+        with etapa("omr.relleno"):
+            fill = bubble_fill(aligned, layout.coords)
+            threshold, seleccion = decide_answers(fill)
+        if not debug_image:
+            return fill, threshold, seleccion, None
+
+        inversa = np.linalg.inv(homografia)
+        mapear = lambda pts: cv2.perspectiveTransform(pts.reshape(-1, 1, 2), inversa).reshape(-1, 2) * escala
+        with etapa("omr.dibujo"):
+            draw_bubbles(lienzo, layout.coords, seleccion, mapear)
+        return fill, threshold, seleccion, lienzo
+
+    with etapa("omr.filas"):
+        col_bounds = detect_columns(gray)
+        col_rows, coords, fill = analyze_rows(gray, col_bounds)
+    with etapa("omr.relleno"):
+        threshold, seleccion = decide_answers(fill)
+    if not debug_image:
+        return fill, threshold, seleccion, None
+
+    mapear = None if np.all(escala == 1) else (lambda pts: pts * escala)
+    with etapa("omr.dibujo"):
+        draw_row_overlay(lienzo, col_bounds, col_rows, coords, seleccion, mapear)
+    return fill, threshold, seleccion, lienzo
+
+def calificar_imagen(gray, debug_image=False, original=None):
+    """Califica una hoja en gris a resolución de trabajo. Devuelve (respuestas, imagen_marcada)."""
+    _, _, seleccion, lienzo = leer_imagen(gray, debug_image, original)
+    return format_answers(seleccion), lienzo
+
+EXTENSIONES_IMAGEN = (".jpg", ".jpeg", ".png", ".bmp", ".tiff")
+
+router.add_event_handler("shutdown", cerrar_executor)
+
+# Imágenes marcadas (modo debug_image) guardadas en memoria con expiración
+imagenes_marcadas = TTLCache(
+    maxsize=int(os.environ.get("OMR_IMAGENES_MAX", 128)),
+    ttl=int(os.environ.get("OMR_IMAGENES_TTL", 600)),
+)
+
+# Decodificación de la hoja: "reducida" (gris, con reducción JPEG 1/2, 1/4 u
+# 1/8 si la resolución lo permite), "gris" (gris completa) o "color" (como antes)
+OMR_DECODIFICACION = os.environ.get("OMR_DECODIFICACION", "reducida")
+# Lado mayor, en píxeles, de la resolución de trabajo (el de plantilla.jpg)
+OMR_LADO_TRABAJO = int(os.environ.get("OMR_LADO_TRABAJO", 1056))
+
+# Documentos de varias hojas (PDF o TIFF de escáner): cada página se rasteriza
+# en gris a OMR_DPI_DOCUMENTO y luego se lleva a la resolución de trabajo
+EXTENSIONES_DOCUMENTO = (".pdf", ".tif", ".tiff")
+OMR_DPI_DOCUMENTO = int(os.environ.get("OMR_DPI_DOCUMENTO", 150))
+OMR_MAX_PAGINAS = max(1, int(os.environ.get("OMR_MAX_PAGINAS", 500)))
+
+LECTURA_REDUCIDA = {
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+}
+
+def tamano_trabajo():
+    """(ancho, alto) de la plantilla a la resolución de trabajo."""
+    ancho, alto = tamano_plantilla()
+    escala = OMR_LADO_TRABAJO / max(ancho, alto)
+    return (round(ancho * escala), round(alto * escala))
+
+def factor_reduccion(contents, lado_trabajo=OMR_LADO_TRABAJO):
+    """Mayor reducción (8, 4, 2 o 1) que deja el lado mayor por encima del de trabajo.
+
+    Solo lee la cabecera de la imagen para conocer sus dimensiones.
+    """
+    try:
+        with Image.open(io.BytesIO(contents)) as im:
+            lado = max(im.size)
+    except Exception:
+        return 1
+    for factor in LECTURA_REDUCIDA:
+        if lado / factor >= lado_trabajo:
+            return factor
+    return 1
+
+@etapa("omr.decodificar")
+def decodificar_hoja(contents, modo=OMR_DECODIFICACION, lado_trabajo=OMR_LADO_TRABAJO):
+    """Decodifica la hoja en gris y la lleva a la resolución de trabajo."""
+    file_bytes = np.frombuffer(contents, np.uint8)
+    if modo == "color":
+        img = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+        gray = None if img is None else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    else:
+        factor = factor_reduccion(contents, lado_trabajo) if modo == "reducida" else 1
+        gray = cv2.imdecode(file_bytes, LECTURA_REDUCIDA.get(factor, cv2.IMREAD_GRAYSCALE))
+    if gray is None:
+        raise ValueError("No se pudo leer la imagen. Formato inválido o archivo corrupto.")
+    return a_resolucion_trabajo(gray, lado_trabajo)
+
+def a_resolucion_trabajo(gray, lado_trabajo=OMR_LADO_TRABAJO):
+    """Reduce la hoja en gris si su lado mayor supera el de trabajo."""
+    lado = max(gray.shape[:2])
+    if lado > lado_trabajo:
+        escala = lado_trabajo / lado
+        gray = cv2.resize(gray, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+    return gray
+
+@etapa("omr.hoja")
+def leer_hoja(contents, debug_image=None):
+    """Decodifica una hoja de respuestas y devuelve (LecturaHoja, imagen_marcada).
+
+    Se ejecuta dentro de los procesos del pool, por eso recibe y devuelve bytes
+    y arreglos pequeños. La imagen marcada solo se genera si `debug_image` es
+    "jpg" o "png"; solo en ese caso se decodifica además la hoja en color a
+    resolución completa.
+    """
+    try:
+        gray = decodificar_hoja(contents)
+    except ValueError:
+        contar("newton_hojas_total", resultado="ilegible")
+        raise
+    original = None
+    if debug_image:
+        with etapa("omr.decodificar_color"):
+            original = cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+    fill, threshold, seleccion, marked = leer_imagen(gray, debug_image=bool(debug_image), original=original)
+    lectura = lectura_compacta(fill, threshold, seleccion)
+    contar("newton_hojas_total", resultado="calificada")
+    if marked is None:
+        return lectura, None
+    with etapa("omr.imagen_marcada"):
+        ok, buffer = cv2.imencode(f".{debug_image}", marked)
+    return lectura, buffer.tobytes() if ok else None
+
+def calentar():
+    """Lee la plantilla en blanco una vez: carga su layout y las rutas de OpenCV del proceso."""
+    with open(PLANTILLAS[PLANTILLA_POR_DEFECTO], "rb") as f:
+        leer_hoja(f.read())
+
+@etapa("omr.pagina")
+def leer_pagina(ruta, indice, dpi=OMR_DPI_DOCUMENTO):
+    """Rasteriza la página `indice` del documento en `ruta` y la lee como una hoja.
+
+    Corre en los procesos del pool: recibe la ruta del documento y no sus
+    bytes, y solo se rasteriza la página pedida. Devuelve (LecturaHoja, None),
+    como leer_hoja sin imagen marcada.
+    """
+    with etapa("omr.rasterizar"):
+        with fitz.open(ruta) as documento:
+            pixmap = documento.load_page(indice).get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+        gray = np.frombuffer(pixmap.samples, np.uint8).reshape(pixmap.height, pixmap.stride)[:, :pixmap.width]
+    fill, threshold, seleccion, _ = leer_imagen(a_resolucion_trabajo(gray))
+    contar("newton_hojas_total", resultado="calificada")
+    return lectura_compacta(fill, threshold, seleccion), None
+
+def calificar_hoja(contents, debug_image=None):
+    """Como leer_hoja, pero con las respuestas como lista de diccionarios."""
+    lectura, imagen = leer_hoja(contents, debug_image)
+    return respuestas_de_lectura(lectura), imagen
+
+def extraer_hojas(nombre, contents):
+    """Devuelve pares (nombre, bytes) de las imágenes de un archivo suelto o de un ZIP."""
+    if nombre.lower().endswith(".zip"):
+        hojas = []
+        with zipfile.ZipFile(io.BytesIO(contents)) as zf:
+            for info in sorted(zf.infolist(), key=lambda i: i.filename):
+                base = os.path.basename(info.filename)
+                if info.is_dir() or base.startswith(".") or not base.lower().endswith(EXTENSIONES_IMAGEN):
+                    continue
+                hojas.append((info.filename, zf.read(info)))
+        return hojas
+    if nombre.lower().endswith(EXTENSIONES_IMAGEN):
+        return [(nombre, contents)]
+    raise ValueError(f"Archivo no soportado: {nombre}")
+
+async def calificar_en_ventana(hojas, funcion=calificar_hoja):
+    """Califica pares (nombre, bytes) en el pool y los entrega según terminan.
+
+    `hojas` puede ser un generador: solo se avanza a medida que se libera la
+    ventana. El segundo elemento de cada par es el argumento de `funcion`.
+
+    Mantiene como máximo OMR_MAX_EN_CURSO hojas pendientes a la vez, así
+    comparte el pool con las peticiones individuales sin llenar la cola de
+    admisión. La petición debe haber pasado admitir_lote(): las hojas esperan
+    su turno sin límite de tiempo. Cada resultado es {"indice", "archivo", "success", "data"|"error"};
+    "data" es lo que devuelve `funcion` (calificar_hoja o leer_hoja).
+    """
+    async def calificar(indice, nombre, contents):
+        try:
+            respuestas, _ = await ejecutar_en_pool(funcion, contents, limitar_cola=False)
+            return {"indice": indice, "archivo": nombre, "success": True, "data": respuestas}
+        except Exception as e:
+            return {"indice": indice, "archivo": nombre, "success": False, "error": f"Error procesando imagen: {str(e)}"}
+
+    pendientes = iter(enumerate(hojas))
+    tareas = set()
+    try:
+        while True:
+            while len(tareas) < OMR_MAX_EN_CURSO:
+                siguiente = next(pendientes, None)
+                if siguiente is None:
+                    break
+                indice, (nombre, contents) = siguiente
+                tareas.add(asyncio.ensure_future(calificar(indice, nombre, contents)))
+            if not tareas:
+                break
+            terminadas, tareas = await asyncio.wait(tareas, return_when=asyncio.FIRST_COMPLETED)
+            for tarea in terminadas:
+                yield tarea.result()
+    finally:
+        for tarea in tareas:
+            tarea.cancel()
+
+async def leer_hojas(files):
+    """Lee los archivos subidos y devuelve sus hojas; 400 si alguno no sirve."""
+    hojas = []
+    try:
+        for file in files:
+            hojas.extend(extraer_hojas(file.filename, await file.read()))
+    except (ValueError, zipfile.BadZipFile) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not hojas:
+        raise HTTPException(status_code=400, detail="No se encontraron imágenes para calificar")
+    return hojas
+
+@router.post("/obtener-respuestas-estudiantes-lote")
+async def obtener_respuestas_estudiantes_lote(
+    files: List[UploadFile] = File(...),
+    formato: Optional[Literal["json", "binario"]] = Query(None),
+    accept: Optional[str] = Header(None),
+    detalle: bool = Query(False),
+    solo_revision: bool = Query(False),
+):
+    """Califica varias hojas (imágenes sueltas o un ZIP) en paralelo.
+
+    Responde una entrada por hoja en el orden en que terminan: líneas NDJSON
+    o, con formato=binario (o Accept: application/octet-stream), registros
+    binarios de formato_resultados (~700 bytes por hoja de 100 preguntas).
+    Cada línea NDJSON lleva "umbral" y "revision"; con `detalle` las respuestas incluyen
+    relleno, margen y banderas. Con `solo_revision` solo se envían las hojas
+    ambiguas y las que fallaron.
+    """
+    hojas = await leer_hojas(files)
+    await admitir_lote()
+    return respuesta_en_flujo(calificar_en_ventana(hojas, leer_hoja), formato, accept, detalle, solo_revision)
+
+def respuesta_en_flujo(lecturas, formato, accept, detalle, solo_revision):
+    """Respuesta en flujo (NDJSON o binaria) de los resultados de calificar_en_ventana con leer_hoja."""
+    async def resultados():
+        async for r in lecturas:
+            if solo_revision and r["success"] and not (r["data"].banderas & BANDERAS_REVISION).any():
+                continue
+            yield r
+
+    if elegir_formato(formato, accept) == "binario":
+        async def generar_binario():
+            async for r in resultados():
+                yield codificar_registro(r["indice"], r["archivo"], r.get("data"), r.get("error"))
+
+        return StreamingResponse(generar_binario(), media_type=MEDIA_BINARIO)
+
+    async def generar():
+        async for r in resultados():
+            if r["success"]:
+                lectura = r["data"]
+                r["data"] = detalle_de_lectura(lectura) if detalle else respuestas_de_lectura(lectura)
+                r["umbral"] = round(lectura.umbral, 1)
+                r["revision"] = revision_de_lectura(lectura)
+            yield linea_json(r)
+
+    return StreamingResponse(generar(), media_type="application/x-ndjson")
+
+@router.post("/obtener-respuestas-estudiantes-documento")
+async def obtener_respuestas_estudiantes_documento(
+    file: UploadFile = File(...),
+    formato: Optional[Literal["json", "binario"]] = Query(None),
+    accept: Optional[str] = Header(None),
+    detalle: bool = Query(False),
+    solo_revision: bool = Query(False),
+):
+    """Califica cada página de un PDF o TIFF de escáner como una hoja.
+
+    Las páginas se rasterizan en los procesos del pool a medida que se libera
+    la ventana de calificación, así nunca hay más de OMR_MAX_EN_CURSO páginas
+    en memoria. La respuesta es la misma que la del lote, una entrada por
+    página en el orden en que terminan; "indice" es el número de página
+    desde 0.
+    """
+    extension = os.path.splitext(file.filename.lower())[1]
+    if extension not in EXTENSIONES_DOCUMENTO:
+        raise HTTPException(status_code=400, detail="El archivo debe ser un PDF o un TIFF (.pdf, .tif, .tiff)")
+
+    contents = await file.read()
+    try:
+        with fitz.open(stream=contents, filetype=extension[1:]) as documento:
+            total_paginas = documento.page_count
+    except Exception:
+        raise HTTPException(status_code=400, detail="No se pudo abrir el documento. Formato inválido o archivo corrupto.")
+    if total_paginas == 0:
+        raise HTTPException(status_code=400, detail="El documento no tiene páginas")
+    if total_paginas > OMR_MAX_PAGINAS:
+        raise HTTPException(status_code=400, detail=f"El documento tiene {total_paginas} páginas; el máximo es {OMR_MAX_PAGINAS}")
+    await admitir_lote()
+
+    async def lecturas():
+        # Los procesos del pool abren el documento por ruta en lugar de recibir
+        # sus bytes con cada página; el archivo se borra al terminar el flujo.
+        # Se usa un directorio temporal y el archivo se cierra antes de que lo
+        # abran los procesos, para evitar el bloqueo en Windows
+        with tempfile.TemporaryDirectory() as temp_dir:
+            ruta = os.path.join(temp_dir, "documento" + extension)
+            with open(ruta, "wb") as documento:
+                documento.write(contents)
+            paginas = ((file.filename, indice) for indice in range(total_paginas))
+            async for r in calificar_en_ventana(paginas, partial(leer_pagina, ruta)):
+                yield r
+
+    return respuesta_en_flujo(lecturas(), formato, accept, detalle, solo_revision)
+
+@router.get("/imagenes-marcadas/{id_imagen}")
+async def obtener_imagen_marcada(id_imagen: str):
+    imagen = imagenes_marcadas.get(id_imagen)
+    if imagen is None:
+        raise HTTPException(status_code=404, detail="Imagen marcada no encontrada o expirada")
+    contenido, media_type = imagen
+    return Response(content=contenido, media_type=media_type)
 
 @router.post("/obtener-respuestas-estudiantes")
-async def obtener_respuestas_estudiantes(file: UploadFile = File(...)):
-    if not file.filename.lower().endswith((".jpg", ".jpeg", ".png", ".bmp", ".tiff")):
+async def obtener_respuestas_estudiantes(
+    file: UploadFile = File(...),
+    debug_image: Optional[Literal["jpg", "png"]] = Query(None),
+    formato: Optional[Literal["json", "binario"]] = Query(None),
+    accept: Optional[str] = Header(None),
+    detalle: bool = Query(False),
+):
+    if not file.filename.lower().endswith(EXTENSIONES_IMAGEN):
         raise HTTPException(status_code=400, detail="El archivo debe ser una imagen válida (.jpg, .png, etc)")
 
     try:
         contents = await file.read()
-        # Leer la imagen en formato numpy array para OpenCV
-        file_bytes = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
-        if img is None:
-            raise HTTPException(status_code=400, detail="No se pudo leer la imagen. Formato inválido o archivo corrupto.")
-
-        # Detectar columnas
-        col_bounds = detect_columns(img)
-
-        # Generar un archivo temporal para la imagen marcada
-        with NamedTemporaryFile(delete=False, suffix=".jpg") as tmpfile:
-            output_img_path = tmpfile.name
-
-        # Procesar y obtener las respuestas
-        respuestas = mark(img, col_bounds, output_img_path)
-
-        return JSONResponse(
-            status_code=200,
-            content={
-                "success": True,
-                "message": "Respuestas detectadas correctamente",
-                "data": respuestas,
-                "output_image_path": output_img_path
-                # "output_image_base64": encoded_img,  # opcional
-            }
-        )
 
+        # Decodificar y procesar la hoja en el pool, fuera del event loop
+        try:
+            lectura, imagen = await ejecutar_en_pool(leer_hoja, contents, debug_image)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # La imagen marcada solo se genera bajo pedido y se sirve desde memoria
+        url_imagen = None
+        if imagen is not None:
+            id_imagen = uuid.uuid4().hex
+            media_type = "image/png" if debug_image == "png" else "image/jpeg"
+            imagenes_marcadas[id_imagen] = (imagen, media_type)
+            url_imagen = f"/imagenes-marcadas/{id_imagen}"
+
+        if elegir_formato(formato, accept) == "binario":
+            headers = {"X-Imagen-Marcada": url_imagen} if url_imagen else None
+            return Response(content=codificar_registro(0, file.filename, lectura),
+                            media_type=MEDIA_BINARIO, headers=headers)
+
+        content = {
+            "success": True,
+            "message": "Respuestas detectadas correctamente",
+            "data": detalle_de_lectura(lectura) if detalle else respuestas_de_lectura(lectura),
+            "umbral": round(lectura.umbral, 1),
+            "revision": revision_de_lectura(lectura),
+        }
+        if url_imagen:
+            content["output_image_url"] = url_imagen
+
+        return ORJSONResponse(status_code=200, content=content)
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error procesando imagen: {str(e)}")
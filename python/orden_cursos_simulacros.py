@@ -5,34 +5,106 @@ import re
 import unidecode
 import fitz  # PyMuPDF
 from collections import defaultdict
-import tempfile
+from bisect import bisect_left, bisect_right
+import asyncio
+import math
 import os
+from cache_resultados import cache_orden_cursos, clave_contenido
+from pool_calificacion import ejecutar_en_proceso, OMR_WORKERS
+from metricas import contar, etapa
 
 router = APIRouter()
 
+# Segmentación en paralelo (variables de entorno): los PDF con más páginas que
+# PDF_PAGINAS_EN_LINEA se reparten entre los procesos del pool, en tramos de al
+# menos PDF_MIN_PAGINAS_TAREA páginas para amortizar el envío del PDF.
+PDF_PAGINAS_EN_LINEA = max(1, int(os.environ.get("PDF_PAGINAS_EN_LINEA", 12)))
+PDF_MIN_PAGINAS_TAREA = max(1, int(os.environ.get("PDF_MIN_PAGINAS_TAREA", 4)))
+
+# get_text("dict") incluye por defecto los bytes de cada imagen; solo se usa el texto
+FLAGS_TEXTO = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+# Cantidad mínima de preguntas en la respuesta; exámenes más largos se
+# extienden hasta el mayor número de pregunta detectado.
+PREGUNTAS_POR_DEFECTO = 100
+# Salto máximo entre números de pregunta consecutivos detectados; un número
+# más lejano (un año o una cifra en negrita en el enunciado) se descarta
+SALTO_MAXIMO_PREGUNTAS = 10
+
+PATRON_NO_PALABRA = re.compile(r'[^\w\s]')
+PATRON_ESPACIOS = re.compile(r'\s+')
+PATRON_NUMERO_PREGUNTA = re.compile(r'^(\d{1,3})\.')
+PATRON_NUMERO_EN_TEXTO = re.compile(r'(?:^|\s)\d{1,3}\.')
+PALABRAS_NEGRITA = ("bold", "black", "heavy", "demibold", "extrabold", "semibold")
+
 def normalizar_texto(texto):
     texto = unidecode.unidecode(texto).lower()
-    texto = re.sub(r'[^\w\s]', '', texto)
-    return re.sub(r'\s+', ' ', texto).strip()
-
-def es_titulo_valido(texto, cursos_normalizados, ancho_linea, ancho_pagina):
-    texto_norm = normalizar_texto(texto)
-    if texto_norm not in cursos_normalizados:
-        return False
-    if texto.isupper():
-        return True
-    proporcion_ancho = ancho_linea / ancho_pagina
-    return proporcion_ancho > 0.3
+    texto = PATRON_NO_PALABRA.sub('', texto)
+    return PATRON_ESPACIOS.sub(' ', texto).strip()
 
 def es_negrita(span):
     fuente = span.get("font", "").lower()
-    palabras_negrita = ["bold", "black", "heavy", "demibold", "extrabold", "semibold"]
-    return any(palabra in fuente for palabra in palabras_negrita)
-
-def procesar_pagina_con_texto(pagina, cursos_normalizados):
+    return any(palabra in fuente for palabra in PALABRAS_NEGRITA)
+
+class MatcherCursos:
+    """Clasificador de líneas armado una vez por petición.
+
+    Guarda los cursos normalizados en un frozenset y memoiza la normalización
+    y la detección de negrita por fuente. Antes de normalizar una línea la
+    descarta si es ASCII y más corta que el curso más corto, o si empieza con
+    una letra o dígito ASCII con el que no empieza ningún curso; ambos
+    descartes son exactos porque normalizar texto ASCII nunca lo alarga ni
+    cambia su primer carácter alfanumérico.
+    """
+
+    def __init__(self, nombres_cursos):
+        self.cursos = frozenset(normalizar_texto(nombre) for nombre in nombres_cursos)
+        self.longitud_minima = min((len(c) for c in self.cursos), default=0)
+        # Un curso que normaliza a "" coincide con líneas de solo puntuación
+        self.iniciales = None if "" in self.cursos else frozenset(c[0] for c in self.cursos)
+        self._normalizados = {}
+        self._negritas = {}
+
+    def normalizar(self, texto):
+        texto_norm = self._normalizados.get(texto)
+        if texto_norm is None:
+            texto_norm = self._normalizados[texto] = normalizar_texto(texto)
+        return texto_norm
+
+    def es_curso(self, texto):
+        if texto.isascii():
+            if len(texto) < self.longitud_minima:
+                return False
+            inicial = texto.lstrip()[:1]
+            if self.iniciales is not None and inicial.isalnum() and inicial.lower() not in self.iniciales:
+                return False
+        return self.normalizar(texto) in self.cursos
+
+    def es_titulo(self, texto, ancho_linea, ancho_pagina):
+        if not self.es_curso(texto):
+            return False
+        if texto.isupper():
+            return True
+        return ancho_linea / ancho_pagina > 0.3
+
+    def es_negrita(self, span):
+        fuente = span.get("font", "")
+        negrita = self._negritas.get(fuente)
+        if negrita is None:
+            negrita = self._negritas[fuente] = es_negrita(span)
+        return negrita
+
+    def numero_pregunta(self, span):
+        """Número de pregunta si el span empieza con "N." en negrita."""
+        m = PATRON_NUMERO_PREGUNTA.match(span["text"].strip())
+        if m and self.es_negrita(span):
+            return int(m.group(1))
+        return None
+
+def procesar_pagina_con_texto(pagina, matcher, textpage=None):
     titulos = []
     preguntas = []
-    texto = pagina.get_text("dict")
+    texto = pagina.get_text("dict", flags=FLAGS_TEXTO, textpage=textpage)
     ancho_pagina = pagina.rect.width
 
     for block in texto["blocks"]:
@@ -40,7 +112,6 @@ def procesar_pagina_con_texto(pagina, cursos_normalizados):
             for line in block["lines"]:
                 texto_linea = ""
                 bbox_linea = None
-                spans_linea = []
 
                 spans = line["spans"]
                 for span in spans:
@@ -49,27 +120,17 @@ def procesar_pagina_con_texto(pagina, cursos_normalizados):
                     else:
                         bbox_linea.include_rect(fitz.Rect(span["bbox"]))
                     texto_linea += span["text"]
-                    spans_linea.append(span)
 
                 texto_linea = texto_linea.strip()
 
                 numero_encontrado = None
                 for span in spans:
-                    texto_span = span["text"].strip()
-                    m = re.match(r'^(\d{1,3})\.', texto_span)
-                    if m and es_negrita(span):
-                        numero_encontrado = int(m.group(1))
+                    numero_encontrado = matcher.numero_pregunta(span)
+                    if numero_encontrado is not None:
                         break
 
                 if texto_linea:
-                    es_titulo = False
-                    if all(es_negrita(span) for span in spans_linea):
-                        es_titulo = es_titulo_valido(texto_linea, cursos_normalizados, bbox_linea.width, ancho_pagina)
-
-                    if not es_titulo:
-                        es_titulo = es_titulo_valido(texto_linea, cursos_normalizados, bbox_linea.width, ancho_pagina)
-
-                    if es_titulo:
+                    if matcher.es_titulo(texto_linea, bbox_linea.width, ancho_pagina):
                         titulos.append({
                             "texto": texto_linea,
                             "bbox": bbox_linea,
@@ -77,7 +138,7 @@ def procesar_pagina_con_texto(pagina, cursos_normalizados):
                             "ancho_pagina": ancho_pagina
                         })
 
-                    if numero_encontrado is not None and 1 <= numero_encontrado <= 100:
+                    if numero_encontrado is not None and numero_encontrado >= 1:
                         preguntas.append({
                             "numero": numero_encontrado,
                             "texto": texto_linea,
@@ -88,6 +149,67 @@ def procesar_pagina_con_texto(pagina, cursos_normalizados):
 
     return titulos, preguntas
 
+def pagina_candidata(pagina, matcher, textpage=None):
+    """Descarte barato con get_text("text") antes de la extracción completa.
+
+    Una página solo puede aportar títulos o preguntas si alguna palabra empieza
+    como número de pregunta o si alguna línea coincide con un curso. Con el
+    `textpage` que luego usa procesar_pagina_con_texto, el texto de la página
+    se extrae una sola vez y el descarte casi no cuesta en las páginas que pasan.
+    """
+    texto = pagina.get_text("text", textpage=textpage)
+    if PATRON_NUMERO_EN_TEXTO.search(texto):
+        return True
+    return any(matcher.es_curso(linea) for linea in texto.splitlines())
+
+def procesar_paginas(contenido_pdf, numeros_pagina, matcher):
+    """Títulos y preguntas de un tramo de páginas; corre en un proceso del pool."""
+    titulos = []
+    preguntas = []
+    with fitz.open(stream=contenido_pdf, filetype="pdf") as pdf:
+        for page_num in numeros_pagina:
+            pagina = pdf.load_page(page_num)
+            textpage = pagina.get_textpage(flags=FLAGS_TEXTO)
+            if not pagina_candidata(pagina, matcher, textpage):
+                contar("newton_paginas_pdf_total", resultado="descartada")
+                continue
+            contar("newton_paginas_pdf_total", resultado="procesada")
+            with etapa("pdf.texto_pagina"):
+                titulos_pagina, preguntas_pagina = procesar_pagina_con_texto(pagina, matcher, textpage)
+            titulos.extend(titulos_pagina)
+            preguntas.extend(preguntas_pagina)
+    return titulos, preguntas
+
+def calentar():
+    """Segmenta un PDF mínimo de una página para inicializar PyMuPDF y unidecode."""
+    with fitz.open() as pdf:
+        pdf.new_page().insert_text((72, 72), "1. Pregunta")
+        contenido = pdf.tobytes()
+    procesar_paginas(contenido, range(1), MatcherCursos(["Curso"]))
+
+async def segmentar_pdf(contenido_pdf, matcher):
+    """Extrae títulos y preguntas de todo el PDF, en orden de página."""
+    with fitz.open(stream=contenido_pdf, filetype="pdf") as pdf:
+        total_paginas = len(pdf)
+
+    if total_paginas <= PDF_PAGINAS_EN_LINEA:
+        return procesar_paginas(contenido_pdf, range(total_paginas), matcher)
+
+    tamano_tramo = max(PDF_MIN_PAGINAS_TAREA, math.ceil(total_paginas / OMR_WORKERS))
+    tareas = [
+        ejecutar_en_proceso(
+            procesar_paginas, contenido_pdf,
+            range(inicio, min(inicio + tamano_tramo, total_paginas)), matcher)
+        for inicio in range(0, total_paginas, tamano_tramo)
+    ]
+
+    titulos = []
+    preguntas = []
+    for titulos_tramo, preguntas_tramo in await asyncio.gather(*tareas):
+        titulos.extend(titulos_tramo)
+        preguntas.extend(preguntas_tramo)
+    return titulos, preguntas
+
 def ordenar_por_posicion_pag_columna(items):
     agrupado = defaultdict(list)
     for i in items:
@@ -112,117 +234,143 @@ def ordenar_por_posicion_pag_columna(items):
 
     return orden_final
 
+def lista_cursos_canonica(cursos_data):
+    """Solo los campos que influyen en el resultado, en el orden recibido.
+
+    Cambios de metadatos (fechas, mensajes) en el JSON de cursos no alteran la
+    clave de caché.
+    """
+    return json.dumps(
+        [[curso['idcurso'], curso['nombrecurso']] for curso in cursos_data['data']],
+        ensure_ascii=False,
+    )
+
+def clave_posicion(item):
+    """(página, columna, y0): el orden de lectura de ordenar_por_posicion_pag_columna."""
+    columna = 0 if item["bbox"].x0 < item["ancho_pagina"] / 2 else 1
+    return (item["pagina"], columna, item["bbox"].y0)
+
+class IndiceIntervalos:
+    """Intervalos semiabiertos [inicio, fin) -> valor, consultados con bisect.
+
+    Los intervalos se guardan disjuntos y ordenados por inicio. Si dos se
+    solapan gana el que se agregó primero, como en una búsqueda lineal.
+    """
+
+    def __init__(self, intervalos=()):
+        self.inicios = []
+        self.fines = []
+        self.valores = []
+        for inicio, fin, valor in intervalos:
+            self.agregar(inicio, fin, valor)
+
+    def agregar(self, inicio, fin, valor):
+        # Se insertan solo los huecos de [inicio, fin) que aún no están cubiertos
+        i = bisect_right(self.inicios, inicio) - 1
+        if i >= 0 and self.fines[i] > inicio:
+            inicio = self.fines[i]
+        i += 1
+        while inicio < fin:
+            fin_hueco = min(fin, self.inicios[i]) if i < len(self.inicios) else fin
+            if inicio < fin_hueco:
+                self.inicios.insert(i, inicio)
+                self.fines.insert(i, fin_hueco)
+                self.valores.insert(i, valor)
+                i += 1
+            if i >= len(self.inicios):
+                break
+            inicio = self.fines[i]
+            i += 1
+
+    def buscar(self, punto, defecto=None):
+        i = bisect_right(self.inicios, punto) - 1
+        if i >= 0 and punto < self.fines[i]:
+            return self.valores[i]
+        return defecto
+
+def descartar_numeros_atipicos(preguntas):
+    """Preguntas cuyo número continúa la secuencia que empieza en 1.
+
+    Se recorren los números detectados en orden y se aceptan mientras no
+    salten más de SALTO_MAXIMO_PREGUNTAS sobre el mayor aceptado; así una
+    pregunta no detectada no corta el examen, pero un "250." suelto no lo
+    extiende hasta 250.
+    """
+    maximo = 0
+    for numero in sorted({p["numero"] for p in preguntas}):
+        if numero > maximo + SALTO_MAXIMO_PREGUNTAS:
+            break
+        maximo = numero
+    return [p for p in preguntas if p["numero"] <= maximo]
+
+async def ordenar_cursos(contenido_pdf, cursos_data):
+    cursos_originales = [curso['nombrecurso'] for curso in cursos_data['data']]
+    matcher = MatcherCursos(cursos_originales)
+
+    # Curso normalizado -> id (gana el último) y nombre original (gana el primero)
+    cursos_id_map = {}
+    cursos_nombre_map = {}
+    for curso in cursos_data['data']:
+        curso_norm = matcher.normalizar(curso['nombrecurso'])
+        cursos_id_map[curso_norm] = curso['idcurso']
+        cursos_nombre_map.setdefault(curso_norm, curso['nombrecurso'])
+
+    titulos_detectados, preguntas_detectadas = await segmentar_pdf(contenido_pdf, matcher)
+    preguntas_detectadas = descartar_numeros_atipicos(preguntas_detectadas)
+
+    total_preguntas = max([PREGUNTAS_POR_DEFECTO] + [p["numero"] for p in preguntas_detectadas])
+    sin_pregunta = total_preguntas + 1
+
+    titulos_ordenados = ordenar_por_posicion_pag_columna(titulos_detectados)
+    preguntas_ordenadas_pos = ordenar_por_posicion_pag_columna(preguntas_detectadas)
+    claves_preguntas = [clave_posicion(p) for p in preguntas_ordenadas_pos]
+
+    # Cada curso empieza en la primera pregunta que aparece después de su título
+    pregunta_inicio_por_curso = []
+    for titulo in titulos_ordenados:
+        i = bisect_left(claves_preguntas, clave_posicion(titulo))
+        if i < len(preguntas_ordenadas_pos):
+            pregunta_inicio_por_curso.append(preguntas_ordenadas_pos[i]["numero"])
+        else:
+            pregunta_inicio_por_curso.append(sin_pregunta)
+
+    rangos_cursos = IndiceIntervalos(
+        (inicio, fin, matcher.normalizar(titulo["texto"]))
+        for titulo, inicio, fin in zip(titulos_ordenados, pregunta_inicio_por_curso,
+                                       pregunta_inicio_por_curso[1:] + [sin_pregunta])
+    )
+
+    resultado_json = []
+    for num in range(1, total_preguntas + 1):
+        curso_asignado = rangos_cursos.buscar(num)
+        resultado_json.append({
+            "numeropregunta": num,
+            "idcurso": cursos_id_map.get(curso_asignado, "") if curso_asignado else "",
+            "nombrecurso": cursos_nombre_map.get(curso_asignado, "") if curso_asignado else ""
+        })
+
+    return resultado_json
+
+async def ordenar_cursos_en_cache(contenido_pdf, cursos_data):
+    clave = clave_contenido(contenido_pdf, lista_cursos_canonica(cursos_data))
+    resultado_json = cache_orden_cursos.obtener(clave)
+    if resultado_json is None:
+        resultado_json = await ordenar_cursos(contenido_pdf, cursos_data)
+        cache_orden_cursos.guardar(clave, resultado_json)
+    return resultado_json
+
 @router.post("/ordenar-cursos-preguntas")
 async def ordenar_cursos_preguntas(pdf_file: UploadFile = File(...), json_file: UploadFile = File(...)):
     try:
-        # Usar un directorio temporal para evitar bloqueo en Windows
-        with tempfile.TemporaryDirectory() as temp_dir:
-            pdf_path = os.path.join(temp_dir, "archivo.pdf")
-            json_path = os.path.join(temp_dir, "cursos.json")
-
-            # Guardar archivos temporalmente
-            contenido_pdf = await pdf_file.read()
-            contenido_json = await json_file.read()
-
-            with open(pdf_path, "wb") as f_pdf:
-                f_pdf.write(contenido_pdf)
-
-            with open(json_path, "wb") as f_json:
-                f_json.write(contenido_json)
-
-            # Cargar JSON cursos
-            with open(json_path, 'r', encoding='utf-8') as f:
-                cursos_data = json.load(f)
-
-            cursos_originales = [curso['nombrecurso'] for curso in cursos_data['data']]
-            cursos_normalizados = [normalizar_texto(curso) for curso in cursos_originales]
-            cursos_id_map = {normalizar_texto(curso['nombrecurso']): curso['idcurso'] for curso in cursos_data['data']}
-
-            pdf = fitz.open(pdf_path)
-
-            titulos_detectados = []
-            preguntas_detectadas = []
-
-            for page_num in range(len(pdf)):
-                pagina = pdf.load_page(page_num)
-                titulos_pagina, preguntas_pagina = procesar_pagina_con_texto(pagina, cursos_normalizados)
-
-                titulos_detectados.extend(titulos_pagina)
-                preguntas_detectadas.extend(preguntas_pagina)
-
-            titulos_ordenados = ordenar_por_posicion_pag_columna(titulos_detectados)
-            preguntas_ordenadas = sorted(preguntas_detectadas, key=lambda p: p["numero"])
-            preguntas_ordenadas_pos = ordenar_por_posicion_pag_columna(preguntas_detectadas)
-
-            pregunta_inicio_por_curso = []
-            for titulo in titulos_ordenados:
-                pagina_t = titulo["pagina"]
-                y0_t = titulo["bbox"].y0
-                x0_t = titulo["bbox"].x0
-                ancho_pagina = titulo["ancho_pagina"]
-                centro_x = ancho_pagina / 2
-
-                encontrada = None
-                for p in preguntas_ordenadas_pos:
-                    if p["pagina"] > pagina_t:
-                        encontrada = p
-                        break
-                    elif p["pagina"] == pagina_t:
-                        p_columna = "izq" if p["bbox"].x0 < centro_x else "der"
-                        t_columna = "izq" if x0_t < centro_x else "der"
-                        if t_columna == "izq" and p_columna == "der":
-                            encontrada = p
-                            break
-                        elif t_columna == p_columna:
-                            if p["bbox"].y0 >= y0_t:
-                                encontrada = p
-                                break
-                if encontrada is not None:
-                    pregunta_inicio_por_curso.append(encontrada["numero"])
-                else:
-                    pregunta_inicio_por_curso.append(101)
-
-            rangos_cursos = []
-            for i, titulo in enumerate(titulos_ordenados):
-                inicio = pregunta_inicio_por_curso[i]
-                fin = pregunta_inicio_por_curso[i + 1] if i + 1 < len(titulos_ordenados) else 101
-                rangos_cursos.append({
-                    "curso_norm": normalizar_texto(titulo["texto"]),
-                    "inicio": inicio,
-                    "fin": fin
-                })
-
-            preguntas_por_curso = defaultdict(int)
-            for p in preguntas_ordenadas:
-                n = p["numero"]
-                for rango in rangos_cursos:
-                    if rango["inicio"] <= n < rango["fin"]:
-                        preguntas_por_curso[rango["curso_norm"]] += 1
-                        break
-
-            resultado_json = []
-            for num in range(1, 101):
-                curso_asignado = ""
-                idcurso_asignado = ""
-                for rango in rangos_cursos:
-                    if rango["inicio"] <= num < rango["fin"]:
-                        curso_asignado = rango["curso_norm"]
-                        break
-                if curso_asignado:
-                    idcurso_asignado = cursos_id_map.get(curso_asignado, "")
-                    nombre_original = next((c['nombrecurso'] for c in cursos_data['data'] if normalizar_texto(c['nombrecurso']) == curso_asignado), "")
-                else:
-                    nombre_original = ""
+        contenido_pdf = await pdf_file.read()
+        contenido_json = await json_file.read()
 
-                resultado_json.append({
-                    "numeropregunta": num,
-                    "idcurso": idcurso_asignado,
-                    "nombrecurso": nombre_original
-                })
+        # Cargar JSON cursos
+        cursos_data = json.loads(contenido_json.decode('utf-8'))
 
-            pdf.close()
+        resultado_json = await ordenar_cursos_en_cache(contenido_pdf, cursos_data)
 
-            return {"success": True, "data": resultado_json}
+        return {"success": True, "data": resultado_json}
 
     except Exception as e:
         import traceback
@@ -0,0 +1,88 @@
+from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.responses import JSONResponse
+from typing import List
+import asyncio
+import json
+from obtener_respuestas_admin import obtener_respuestas_correctas
+from orden_cursos_simulacros import ordenar_cursos_en_cache
+from obtener_respuestas_estudiantes import calificar_en_ventana, leer_hojas
+from pool_calificacion import admitir_lote
+from puntuacion_cohorte import (matriz_respuestas, vector_clave, vector_cursos, puntuar_cohorte,
+                                listas_errores, resumen_estudiante, estadisticas_items)
+
+router = APIRouter()
+
+@router.post("/procesar-simulacro")
+async def procesar_simulacro(
+    pdf_file: UploadFile = File(...),
+    json_file: UploadFile = File(...),
+    excel_file: UploadFile = File(...),
+    files: List[UploadFile] = File(...),
+):
+    """Simulacro completo en una sola petición.
+
+    Ordena cursos del PDF, lee la clave del Excel y califica las hojas (imágenes
+    sueltas o ZIP) a la vez; luego devuelve por estudiante el puntaje total y
+    por curso, con la lista de preguntas erradas de cada curso, y la dificultad
+    y discriminación de cada pregunta en la promoción.
+    """
+    if not pdf_file.filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="El archivo del simulacro debe ser un PDF")
+    if not excel_file.filename.endswith((".xlsx", ".xls")):
+        raise HTTPException(status_code=400, detail="Archivo debe ser Excel (.xlsx o .xls)")
+
+    try:
+        contenido_pdf = await pdf_file.read()
+        cursos_data = json.loads((await json_file.read()).decode('utf-8'))
+        contenido_excel = await excel_file.read()
+        hojas = await leer_hojas(files)
+        await admitir_lote()
+
+        async def calificar_todas():
+            return sorted([r async for r in calificar_en_ventana(hojas)], key=lambda r: r["indice"])
+
+        try:
+            preguntas, respuestas_correctas, hojas_calificadas = await asyncio.gather(
+                ordenar_cursos_en_cache(contenido_pdf, cursos_data),
+                obtener_respuestas_correctas(contenido_excel, excel_file.filename),
+                calificar_todas(),
+            )
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+
+        # Toda la promoción se califica de una vez sobre una matriz de códigos
+        calificadas = [h for h in hojas_calificadas if h["success"]]
+        total_preguntas = max((r["numeropregunta"] for h in calificadas for r in h["data"]), default=0)
+        cursos, curso_idx = vector_cursos(preguntas, total_preguntas)
+        matriz = matriz_respuestas([h["data"] for h in calificadas], total_preguntas)
+        resultado = puntuar_cohorte(matriz, vector_clave(respuestas_correctas, total_preguntas), curso_idx, cursos)
+        errores = listas_errores(resultado)
+
+        estudiantes = []
+        fila = 0
+        for hoja in hojas_calificadas:
+            estudiante = {"indice": hoja["indice"], "archivo": hoja["archivo"], "success": hoja["success"]}
+            if hoja["success"]:
+                estudiante.update(resumen_estudiante(resultado, fila, errores[fila]))
+                estudiante["respuestas"] = hoja["data"]
+                fila += 1
+            else:
+                estudiante["error"] = hoja["error"]
+            estudiantes.append(estudiante)
+
+        return {
+            "success": True,
+            "data": {
+                "preguntas": preguntas,
+                "respuestas_correctas": respuestas_correctas,
+                "estudiantes": estudiantes,
+                "estadisticas_preguntas": estadisticas_items(resultado),
+            },
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return JSONResponse(status_code=500, content={"error": f"Error procesando simulacro: {str(e)}"})
@@ -0,0 +1,117 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException
+from metricas import en_proceso, esperar_proceso, registro
+
+# Configuración del pool de calificación (variables de entorno)
+OMR_WORKERS = max(1, int(os.environ.get("OMR_WORKERS", os.cpu_count() or 1)))
+OMR_MAX_EN_CURSO = max(1, int(os.environ.get("OMR_MAX_EN_CURSO", OMR_WORKERS)))
+OMR_MAX_COLA = max(0, int(os.environ.get("OMR_MAX_COLA", OMR_MAX_EN_CURSO * 4)))
+OMR_TIMEOUT_COLA = float(os.environ.get("OMR_TIMEOUT_COLA", 30))
+
+# Pool de procesos para el trabajo de OpenCV; se crea en el primer uso.
+_executor = None
+
+def obtener_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=OMR_WORKERS)
+    return _executor
+
+def cerrar_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+class ControlAdmision:
+    """Limita las hojas en proceso y la cantidad de peticiones esperando turno.
+
+    - Si la cola de espera está llena se rechaza de inmediato con 429.
+    - Si una petición espera más de `timeout_cola` segundos se responde 503.
+
+    Los lotes pasan estos controles una sola vez, con admitir_lote(), antes
+    de empezar a responder; sus hojas luego esperan turno sin límites.
+
+    El turno se libera cuando el proceso termina la hoja, aunque el cliente
+    se haya desconectado antes, para que el límite refleje el trabajo real.
+    """
+
+    def __init__(self, max_en_curso, max_cola, timeout_cola):
+        self.max_en_curso = max_en_curso
+        self.max_cola = max_cola
+        self.timeout_cola = timeout_cola
+        self.en_curso = 0
+        self.en_cola = 0
+        self._semaforo = asyncio.Semaphore(max_en_curso)
+
+    async def _esperar_turno(self, limitar_cola):
+        if limitar_cola and self.en_curso + self.en_cola >= self.max_en_curso + self.max_cola:
+            raise HTTPException(
+                status_code=429,
+                detail="Demasiadas hojas en espera de calificación, intente nuevamente",
+                headers={"Retry-After": "1"},
+            )
+
+        self.en_cola += 1
+        try:
+            await asyncio.wait_for(self._semaforo.acquire(), timeout=self.timeout_cola if limitar_cola else None)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=503,
+                detail="Servicio de calificación saturado, intente nuevamente",
+                headers={"Retry-After": str(max(1, int(self.timeout_cola)))},
+            )
+        finally:
+            self.en_cola -= 1
+        self.en_curso += 1
+
+    def _liberar(self):
+        self.en_curso -= 1
+        self._semaforo.release()
+
+    async def admitir_lote(self):
+        """429 o 503 si un lote no tendría turno; si lo tendría, lo devuelve enseguida."""
+        await self._esperar_turno(True)
+        self._liberar()
+
+    async def ejecutar(self, func, *args, limitar_cola=True):
+        await self._esperar_turno(limitar_cola)
+        try:
+            future = obtener_executor().submit(en_proceso, func, *args)
+        except Exception:
+            self._liberar()
+            raise
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._liberar))
+        return await esperar_proceso(future)
+
+control_admision = ControlAdmision(OMR_MAX_EN_CURSO, OMR_MAX_COLA, OMR_TIMEOUT_COLA)
+registro.medidor_funcion("newton_pool_hojas_en_curso", lambda: control_admision.en_curso)
+registro.medidor_funcion("newton_pool_hojas_en_cola", lambda: control_admision.en_cola)
+
+async def ejecutar_en_pool(func, *args, limitar_cola=True):
+    """Ejecuta `func(*args)` en el pool de procesos respetando el control de admisión.
+
+    Con `limitar_cola=False` la llamada espera su turno sin límite de cola ni
+    de tiempo (lo usan las hojas de los lotes, que ya pasaron admitir_lote()
+    y acotan su propia ventana).
+    """
+    return await control_admision.ejecutar(func, *args, limitar_cola=limitar_cola)
+
+async def admitir_lote():
+    """Control de admisión de una petición de lote, antes de calificar sus hojas.
+
+    Lanza HTTPException 429 (cola llena) o 503 (sin turno a tiempo) mientras
+    todavía se puede responder con ese código, en lugar de un 200 con un
+    error 503 por hoja.
+    """
+    await control_admision.admitir_lote()
+
+async def ejecutar_en_proceso(func, *args):
+    """Ejecuta `func(*args)` en el pool sin control de admisión (Excel, PDF).
+
+    Las métricas que registre `func` en el proceso se suman al registro local.
+    """
+    return await esperar_proceso(obtener_executor().submit(en_proceso, func, *args))
@@ -0,0 +1,216 @@
+from typing import List, NamedTuple, Tuple
+import numpy as np
+
+# Puntaje por pregunta, igual que en el backend
+PUNTAJE_CORRECTA = 4.07
+DESCUENTO_INCORRECTA = 1.0175
+
+# Códigos de opción en la matriz de respuestas: 0 = en blanco (o sin clave)
+OPCIONES = "ABCDE"
+CODIGO_OPCION = {op: i + 1 for i, op in enumerate(OPCIONES)}
+CODIGO_OPCION.update({op.lower(): i + 1 for i, op in enumerate(OPCIONES)})
+
+class ResultadoCohorte(NamedTuple):
+    """Resultados de una promoción; filas = estudiantes, columnas = preguntas."""
+    cursos: List[Tuple[object, str]]   # (idcurso, nombrecurso) por índice de curso
+    curso_idx: np.ndarray              # (Q,) índice de curso de cada pregunta, -1 si no tiene
+    correcta: np.ndarray               # (S, Q) bool
+    incorrecta: np.ndarray             # (S, Q) bool
+    blanco: np.ndarray                 # (S, Q) bool
+    correctas: np.ndarray              # (S,)
+    incorrectas: np.ndarray            # (S,)
+    enblanco: np.ndarray               # (S,)
+    puntaje: np.ndarray                # (S,)
+    correctas_curso: np.ndarray        # (S, K)
+    incorrectas_curso: np.ndarray      # (S, K)
+    enblanco_curso: np.ndarray         # (S, K)
+    puntaje_curso: np.ndarray          # (S, K)
+    dificultad: np.ndarray             # (Q,) proporción de aciertos
+    discriminacion: np.ndarray         # (Q,) correlación ítem-resto, NaN si no hay varianza
+
+def codificar_respuestas(respuestas, total_preguntas):
+    """Lista de {"numeropregunta", "opcionseleccionada"} -> vector uint8 de códigos."""
+    fila = np.zeros(total_preguntas, np.uint8)
+    for r in respuestas:
+        n = r["numeropregunta"]
+        if 1 <= n <= total_preguntas:
+            fila[n - 1] = CODIGO_OPCION.get(r["opcionseleccionada"], 0)
+    return fila
+
+def matriz_respuestas(hojas, total_preguntas):
+    """Respuestas de varias hojas -> matriz (estudiantes, preguntas) uint8."""
+    matriz = np.zeros((len(hojas), total_preguntas), np.uint8)
+    for fila, respuestas in enumerate(hojas):
+        matriz[fila] = codificar_respuestas(respuestas, total_preguntas)
+    return matriz
+
+def vector_clave(respuestas_correctas, total_preguntas):
+    """Lista de {"numeropregunta", "opcioncorrecta"} -> vector uint8 (0 = sin clave)."""
+    clave = np.zeros(total_preguntas, np.uint8)
+    for r in respuestas_correctas:
+        n = r["numeropregunta"]
+        if 1 <= n <= total_preguntas:
+            clave[n - 1] = CODIGO_OPCION.get(str(r["opcioncorrecta"]).strip(), 0)
+    return clave
+
+def vector_cursos(preguntas, total_preguntas):
+    """Salida de ordenar_cursos -> (lista de (idcurso, nombrecurso), índice de curso por pregunta)."""
+    cursos = []
+    indices = {}
+    curso_idx = np.full(total_preguntas, -1, np.int32)
+    for p in preguntas:
+        n = p["numeropregunta"]
+        if p["idcurso"] == "" or not 1 <= n <= total_preguntas:
+            continue
+        if p["idcurso"] not in indices:
+            indices[p["idcurso"]] = len(cursos)
+            cursos.append((p["idcurso"], p["nombrecurso"]))
+        curso_idx[n - 1] = indices[p["idcurso"]]
+    return cursos, curso_idx
+
+def puntaje(correctas, incorrectas):
+    return correctas * PUNTAJE_CORRECTA - incorrectas * DESCUENTO_INCORRECTA
+
+def correlacion_item_resto(correcta):
+    """Discriminación de cada ítem: correlación de Pearson (punto-biserial)
+    entre acertarlo y el número de aciertos en el resto de la prueba."""
+    if len(correcta) == 0:
+        return np.full(correcta.shape[1], np.nan)
+    # Con T = aciertos totales y resto = T - x: cov(x, resto) = cov(x, T) - var(x)
+    # y var(resto) = var(T) - 2 cov(x, T) + var(x); así no se arma la matriz del resto.
+    x = correcta.astype(np.float64)
+    total = x.sum(axis=1)
+    centrado = total - total.mean()
+    cov_total = centrado @ x / len(x)
+    p = x.mean(axis=0)
+    var_x = p * (1 - p)
+    cov = cov_total - var_x
+    var_resto = centrado.var() - 2 * cov_total + var_x
+    # Las varianzas de conteos enteros no nulas nunca son tan pequeñas
+    valido = (var_x > 1e-9) & (var_resto > 1e-9)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(valido, cov / np.sqrt(var_x * np.maximum(var_resto, 0)), np.nan)
+
+def sumador_por_curso(curso_idx, n_cursos):
+    """Función que suma una matriz booleana (S, Q) por curso -> (S, K) int32.
+
+    Ordena las columnas por curso una sola vez y suma cada tramo con
+    np.add.reduceat; los cursos sin preguntas quedan en cero.
+    """
+    orden = np.argsort(curso_idx, kind="stable")
+    inicios = np.searchsorted(curso_idx[orden], np.arange(n_cursos))
+    con_preguntas = np.bincount(curso_idx[curso_idx >= 0], minlength=n_cursos)[:n_cursos] > 0
+    inicios = inicios[con_preguntas]
+
+    def sumar(mascara):
+        suma = np.zeros((len(mascara), n_cursos), np.int32)
+        if len(inicios):
+            suma[:, con_preguntas] = np.add.reduceat(mascara[:, orden], inicios, axis=1, dtype=np.int32)
+        return suma
+    return sumar
+
+def puntuar_cohorte(respuestas, clave, curso_idx, cursos):
+    """Califica toda la promoción de una vez.
+
+    `respuestas` es (S, Q) uint8 con 0 = en blanco y 1..5 = A..E; `clave` es
+    (Q,) con 0 = sin clave. Como en el backend, una pregunta marcada que no
+    coincide con la clave (o sin clave) es incorrecta.
+    """
+    respuestas = np.asarray(respuestas, np.uint8)
+    blanco = respuestas == 0
+    correcta = (respuestas == clave) & ~blanco
+    incorrecta = ~blanco & ~correcta
+
+    sumar_por_curso = sumador_por_curso(curso_idx, len(cursos))
+    correctas_curso = sumar_por_curso(correcta)
+    incorrectas_curso = sumar_por_curso(incorrecta)
+    enblanco_curso = sumar_por_curso(blanco)
+    correctas = correcta.sum(axis=1)
+    incorrectas = incorrecta.sum(axis=1)
+
+    return ResultadoCohorte(
+        cursos=list(cursos),
+        curso_idx=curso_idx,
+        correcta=correcta,
+        incorrecta=incorrecta,
+        blanco=blanco,
+        correctas=correctas,
+        incorrectas=incorrectas,
+        enblanco=blanco.sum(axis=1),
+        puntaje=puntaje(correctas, incorrectas),
+        correctas_curso=correctas_curso,
+        incorrectas_curso=incorrectas_curso,
+        enblanco_curso=enblanco_curso,
+        puntaje_curso=puntaje(correctas_curso, incorrectas_curso),
+        dificultad=correcta.mean(axis=0) if len(respuestas) else np.full(len(clave), np.nan),
+        discriminacion=correlacion_item_resto(correcta),
+    )
+
+def listas_errores(resultado):
+    """Preguntas erradas o en blanco de cada estudiante, por curso.
+
+    Devuelve una lista (por estudiante) de {índice de curso: [numeropregunta, ...]}
+    con los cursos en orden y las preguntas ascendentes.
+    """
+    errores = [dict() for _ in range(len(resultado.correctas))]
+    fallada = ~resultado.correcta
+    for k in range(len(resultado.cursos)):
+        columnas = np.flatnonzero(resultado.curso_idx == k)
+        # Número de pregunta donde hay error y 0 donde no, para filtrar fila por fila
+        numeros = np.where(fallada[:, columnas], columnas + 1, 0).tolist()
+        for s, fila in enumerate(numeros):
+            lista = [n for n in fila if n]
+            if lista:
+                errores[s][k] = lista
+    return errores
+
+def resumen_estudiante(resultado, s, errores=None):
+    """Totales y desglose por curso de un estudiante, en tipos de Python."""
+    errores = errores if errores is not None else listas_errores(resultado)[s]
+    cursos = []
+    for k, (idcurso, nombrecurso) in enumerate(resultado.cursos):
+        cursos.append({
+            "idcurso": idcurso,
+            "nombrecurso": nombrecurso,
+            "correctas": int(resultado.correctas_curso[s, k]),
+            "incorrectas": int(resultado.incorrectas_curso[s, k]),
+            "enblanco": int(resultado.enblanco_curso[s, k]),
+            "puntaje": round(float(resultado.puntaje_curso[s, k]), 4),
+            "lista_errores": errores.get(k, []),
+        })
+    return {
+        "correctas": int(resultado.correctas[s]),
+        "incorrectas": int(resultado.incorrectas[s]),
+        "enblanco": int(resultado.enblanco[s]),
+        "puntaje": round(float(resultado.puntaje[s]), 4),
+        "cursos": cursos,
+    }
+
+def estadisticas_items(resultado):
+    return [
+        {
+            "numeropregunta": q + 1,
+            "dificultad": None if np.isnan(d) else round(float(d), 4),
+            "discriminacion": None if np.isnan(r) else round(float(r), 4),
+        }
+        for q, (d, r) in enumerate(zip(resultado.dificultad, resultado.discriminacion))
+    ]
+
+def entrada_feedback(resultado, s, temas_por_curso, errores=None):
+    """Datos de /feedback-simulacro (InputData) para el estudiante `s`.
+
+    Solo incluye los cursos con errores, como el backend. `temas_por_curso`
+    mapea idcurso -> [{"idtema", "nombretema"}, ...].
+    """
+    errores = errores if errores is not None else listas_errores(resultado)[s]
+    return {
+        "cursos": [
+            {
+                "nombrecurso": resultado.cursos[k][1],
+                "idcurso": resultado.cursos[k][0],
+                "lista_errores": numeros,
+                "temas": temas_por_curso.get(resultado.cursos[k][0], []),
+            }
+            for k, numeros in errores.items()
+        ]
+    }
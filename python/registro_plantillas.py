@@ -0,0 +1,154 @@
+import os
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+import cv2
+import numpy as np
+from PIL import Image
+
+# Plantillas impresas conocidas: id -> imagen de la hoja en blanco
+PLANTILLAS = {
+    "plantilla": os.path.join(os.path.dirname(os.path.abspath(__file__)), "plantilla.jpg"),
+}
+PLANTILLA_POR_DEFECTO = os.environ.get("OMR_PLANTILLA", "plantilla")
+
+# Registro de la hoja contra la plantilla (ORB + homografía)
+ORB_FEATURES = 1000
+RATIO_LOWE = 0.75
+MIN_INLIERS = 40
+
+# Fracción de cada lado de la burbuja que se descarta al muestrear, para no
+# contar el borde impreso del círculo.
+MARGEN_BURBUJA = 0.15
+
+class LayoutPlantilla(NamedTuple):
+    id_plantilla: str
+    tamano: Tuple[int, int]
+    coords: np.ndarray
+    puntos: np.ndarray
+    descriptores: np.ndarray
+
+def detectar_burbujas(gray, preguntas=100, opciones=5, columnas=4):
+    """Ubica las burbujas impresas de una hoja en blanco.
+
+    Devuelve un arreglo (preguntas, opciones, 4) con (x0, y0, x1, y1) de la zona
+    a muestrear de cada burbuja, o None si no se encuentra la grilla completa.
+    """
+    h, w = gray.shape[:2]
+    thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+    contornos, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    cajas = np.array([cv2.boundingRect(c) for c in contornos]).reshape(-1, 4)
+    bw, bh = cajas[:, 2], cajas[:, 3]
+    candidatas = cajas[(bw >= 0.015 * w) & (bw <= 0.05 * w) & (bw <= 1.25 * bh) & (bh <= 1.25 * bw)]
+    if len(candidatas) < preguntas * opciones:
+        return None
+
+    # Las burbujas tienen todas el mismo tamaño; se descartan letras y marcas sueltas
+    mediana = np.median(candidatas[:, 2:], axis=0)
+    burbujas = candidatas[np.all(np.abs(candidatas[:, 2:] - mediana) <= 0.15 * mediana, axis=1)]
+    por_fila = columnas * opciones
+    filas = preguntas // columnas
+    if len(burbujas) != preguntas * opciones:
+        return None
+
+    # Ordenar por fila (centro vertical) y dentro de cada fila de izquierda a derecha
+    burbujas = burbujas[np.argsort(burbujas[:, 1] + burbujas[:, 3] / 2, kind="stable")]
+    burbujas = burbujas.reshape(filas, por_fila, 4)
+    burbujas = np.take_along_axis(burbujas, np.argsort(burbujas[..., 0], axis=1)[..., None], axis=1)
+
+    centros_y = burbujas[..., 1] + burbujas[..., 3] / 2
+    if np.ptp(centros_y, axis=1).max() > mediana[1] / 2:
+        return None
+
+    # (fila, columna, opción) -> pregunta = columna * filas + fila
+    burbujas = burbujas.reshape(filas, columnas, opciones, 4).transpose(1, 0, 2, 3)
+    burbujas = burbujas.reshape(preguntas, opciones, 4)
+
+    x0, y0 = burbujas[..., 0], burbujas[..., 1]
+    x1, y1 = x0 + burbujas[..., 2], y0 + burbujas[..., 3]
+    dx = ((x1 - x0) * MARGEN_BURBUJA).astype(np.int64)
+    dy = ((y1 - y0) * MARGEN_BURBUJA).astype(np.int64)
+    return np.stack([x0 + dx, y0 + dy, x1 - dx, y1 - dy], axis=-1).astype(np.int64)
+
+@lru_cache(maxsize=None)
+def tamano_plantilla(id_plantilla=PLANTILLA_POR_DEFECTO):
+    """(ancho, alto) nativos de la imagen de una plantilla."""
+    ruta = PLANTILLAS.get(id_plantilla)
+    if ruta is None:
+        raise ValueError(f"Plantilla desconocida: {id_plantilla}")
+    with Image.open(ruta) as im:
+        return im.size
+
+@lru_cache(maxsize=8)
+def obtener_layout(id_plantilla=PLANTILLA_POR_DEFECTO, tamano=None):
+    """Layout de burbujas y rasgos ORB de una plantilla, calculado una vez.
+
+    `tamano` es (ancho, alto) de la resolución de trabajo; por defecto la de la
+    imagen de la plantilla. Devuelve None si la plantilla no tiene grilla válida.
+    """
+    ruta = PLANTILLAS.get(id_plantilla)
+    if ruta is None:
+        raise ValueError(f"Plantilla desconocida: {id_plantilla}")
+    gray = cv2.imread(ruta, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ValueError(f"No se pudo leer la plantilla: {ruta}")
+    if tamano is not None and tuple(tamano) != (gray.shape[1], gray.shape[0]):
+        gray = cv2.resize(gray, tuple(tamano), interpolation=cv2.INTER_AREA)
+
+    coords = detectar_burbujas(gray)
+    if coords is None:
+        return None
+
+    puntos, descriptores = cv2.ORB_create(ORB_FEATURES).detectAndCompute(gray, None)
+    return LayoutPlantilla(
+        id_plantilla=id_plantilla,
+        tamano=(gray.shape[1], gray.shape[0]),
+        coords=coords,
+        puntos=np.float32([p.pt for p in puntos]),
+        descriptores=descriptores,
+    )
+
+def _homografias_cercanas(h1, h2, forma, tolerancia=0.02):
+    """Indica si dos homografías llevan las esquinas de la hoja a puntos cercanos."""
+    alto, ancho = forma[:2]
+    esquinas = np.float32([[0, 0], [ancho, 0], [ancho, alto], [0, alto]]).reshape(-1, 1, 2)
+    p1 = cv2.perspectiveTransform(esquinas, h1)
+    p2 = cv2.perspectiveTransform(esquinas, h2)
+    escala = np.ptp(p2.reshape(-1, 2), axis=0).max()
+    return np.abs(p1 - p2).max() <= tolerancia * escala
+
+def registrar_hoja(gray, layout) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Alinea una hoja escaneada (en gris) al marco de la plantilla.
+
+    Devuelve (hoja deformada al tamaño del layout, homografía hoja -> plantilla),
+    o None si no hay suficientes coincidencias para una homografía confiable.
+    """
+    puntos, descriptores = cv2.ORB_create(ORB_FEATURES).detectAndCompute(gray, None)
+    if descriptores is None or len(puntos) < MIN_INLIERS:
+        return None
+
+    matches = cv2.BFMatcher(cv2.NORM_HAMMING).knnMatch(descriptores, layout.descriptores, k=2)
+    buenos = [m[0] for m in matches if len(m) == 2 and m[0].distance < RATIO_LOWE * m[1].distance]
+    if len(buenos) < MIN_INLIERS:
+        return None
+
+    origen = np.float32([puntos[m.queryIdx].pt for m in buenos])
+    destino = layout.puntos[[m.trainIdx for m in buenos]]
+
+    # La grilla de burbujas es muy repetitiva: primero se estima una similitud
+    # (rotación, escala y traslación), que RANSAC resuelve de forma estable, y
+    # con sus inliers se ajusta la homografía para corregir la perspectiva.
+    afin, mascara = cv2.estimateAffinePartial2D(origen, destino, method=cv2.RANSAC,
+                                                ransacReprojThreshold=3.0)
+    if afin is None or int(mascara.sum()) < MIN_INLIERS:
+        return None
+    homografia = np.vstack([afin, [0, 0, 1]])
+
+    inliers = mascara.ravel().astype(bool)
+    refinada, _ = cv2.findHomography(origen[inliers], destino[inliers], cv2.RANSAC, 3.0)
+    if refinada is not None and _homografias_cercanas(refinada, homografia, gray.shape):
+        homografia = refinada
+
+    aligned = cv2.warpPerspective(gray, homografia, layout.tamano,
+                                  flags=cv2.INTER_LINEAR, borderValue=255)
+    return aligned, homografia